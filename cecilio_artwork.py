@@ -0,0 +1,153 @@
+import hashlib
+import io
+import os
+import subprocess
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from PIL import Image
+from pydub.utils import get_encoder_name
+from PyQt5 import QtCore, QtGui
+
+THUMBNAIL_SIZE = 128
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cecilio", "artwork")
+
+
+def extract_embedded_art(path):
+    # Обложка в mp3/flac — это прикреплённый видеопоток, ffmpeg отдаёт его без перекодирования
+    command = [
+        get_encoder_name(), "-nostdin", "-loglevel", "error", "-i", path,
+        "-an", "-map", "0:v:0", "-frames:v", "1", "-c:v", "copy", "-f", "image2pipe", "-",
+    ]
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, timeout=30)
+    return result.stdout or None
+
+
+def fetch_thumbnail(url):
+    response = requests.get(url, timeout=10)
+    response.raise_for_status()
+    return response.content
+
+
+def downscale(data, size=THUMBNAIL_SIZE):
+    image = Image.open(io.BytesIO(data))
+    # draft() уменьшает JPEG прямо при декодировании, полный кадр в память не попадает
+    image.draft("RGB", (size, size))
+    image = image.convert("RGB")
+    image.thumbnail((size, size))
+    output = io.BytesIO()
+    image.save(output, "PNG")
+    return output.getvalue()
+
+
+class ArtworkService(QtCore.QObject):
+    # Двухуровневый кэш: LRU из QPixmap в памяти и PNG-миниатюры на диске по хешу содержимого
+    artworkReady = QtCore.pyqtSignal(str, QtGui.QPixmap)
+    thumbnailDecoded = QtCore.pyqtSignal(str, QtGui.QImage)
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_pixmaps=256, workers=2, parent=None):
+        super().__init__(parent)
+        self.cache_dir = cache_dir
+        self.max_pixmaps = max_pixmaps
+        self.pixmaps = OrderedDict()
+        self.pending = {}
+        self.thumbnail_urls = {}
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        os.makedirs(os.path.join(cache_dir, "keys"), exist_ok=True)
+        self.thumbnailDecoded.connect(self.store_thumbnail)
+
+    def set_thumbnail_url(self, track, url):
+        if url:
+            self.thumbnail_urls[track] = url
+
+    def retain_thumbnail_urls(self, tracks):
+        # Ссылки на обложки нужны только для стримов, которые ещё в плейлисте; проверяется
+        # каждая сохранённая ссылка (их мало), tracks — TrackStore с поиском без сборки путей
+        self.thumbnail_urls = {track: url for track, url in self.thumbnail_urls.items() if track in tracks}
+
+    def request(self, track):
+        # Возвращает миниатюру из памяти сразу; иначе ставит загрузку в пул и вернёт её через artworkReady
+        if track in self.pixmaps:
+            self.pixmaps.move_to_end(track)
+            return self.pixmaps[track]
+        if track not in self.pending:
+            self.pending[track] = self.pool.submit(self.load_thumbnail, track, self.thumbnail_urls.get(track))
+        return None
+
+    def cached(self, track):
+        return self.pixmaps.get(track)
+
+    def cancel_pending(self, keep=None):
+        # Для строк, ушедших с экрана, загрузки можно не ждать; keep — текущий трек, его обложка нужна визуализатору
+        for track, future in list(self.pending.items()):
+            if track != keep and future.cancel():
+                del self.pending[track]
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def track_key(self, track):
+        if "://" in track:
+            identity = self.thumbnail_urls.get(track, track)
+        else:
+            stat = os.stat(track)
+            identity = f"{track}|{stat.st_mtime_ns}|{stat.st_size}"
+        return hashlib.sha1(identity.encode("utf-8")).hexdigest()
+
+    def content_path(self, digest):
+        return os.path.join(self.cache_dir, digest[:2], digest + ".png")
+
+    def load_thumbnail(self, track, thumbnail_url):
+        image = QtGui.QImage()
+        try:
+            key_path = os.path.join(self.cache_dir, "keys", self.track_key(track))
+            digest = ""
+            if os.path.exists(key_path):
+                with open(key_path, "r") as key_file:
+                    digest = key_file.read().strip()
+            # Пустой результат не запоминается (ссылка на обложку может появиться позже),
+            # а удалённая миниатюра собирается заново
+            if not digest or not os.path.exists(self.content_path(digest)):
+                digest = self.build_thumbnail(track, thumbnail_url)
+                if digest:
+                    with open(key_path, "w") as key_file:
+                        key_file.write(digest)
+            if digest:
+                image.load(self.content_path(digest))
+        except Exception as e:
+            print(f"Error loading artwork for {track}: {e}")
+        self.thumbnailDecoded.emit(track, image)
+
+    def build_thumbnail(self, track, thumbnail_url):
+        if "://" in track:
+            data = fetch_thumbnail(thumbnail_url) if thumbnail_url else None
+        else:
+            data = extract_embedded_art(track)
+        if not data:
+            return ""
+        digest = hashlib.sha1(data).hexdigest()
+        path = self.content_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            thumbnail = downscale(data)
+            # Свой временный файл на каждого писателя: одну обложку могут собирать два потока сразу
+            descriptor, temp_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(path))
+            try:
+                with os.fdopen(descriptor, "wb") as thumbnail_file:
+                    thumbnail_file.write(thumbnail)
+                os.replace(temp_path, path)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+        return digest
+
+    def store_thumbnail(self, track, image):
+        self.pending.pop(track, None)
+        # QPixmap можно создавать только в GUI-потоке
+        pixmap = QtGui.QPixmap.fromImage(image) if not image.isNull() else QtGui.QPixmap()
+        self.pixmaps[track] = pixmap
+        self.pixmaps.move_to_end(track)
+        while len(self.pixmaps) > self.max_pixmaps:
+            self.pixmaps.popitem(last=False)
+        self.artworkReady.emit(track, pixmap)
@@ -5,6 +5,7 @@ from torchvision.models import ResNet18_Weights
 from PIL import Image, ImageDraw
 from PyQt5 import QtWidgets, QtGui, QtCore
 from PyQt5.QtMultimedia import QMediaPlayer
+from cecilio_metrics import metrics
 
 
 class AdvancedMusicVisualiser(QtWidgets.QGraphicsView):
@@ -30,6 +31,21 @@ class AdvancedMusicVisualiser(QtWidgets.QGraphicsView):
         self.rotation_angle = 0
         self.pulse_step = 0
 
+        # Спектрограмма: массив NumPy и QImage делят одну память, каждый кадр пишется один столбец
+        self.spectrogram_width = 512
+        self.spectrogram_height = 512
+        self.spectrogram = np.zeros((self.spectrogram_height, self.spectrogram_width, 4), dtype=np.uint8)
+        self.spectrogram_image = QtGui.QImage(
+            self.spectrogram.data,
+            self.spectrogram_width,
+            self.spectrogram_height,
+            self.spectrogram_width * 4,
+            QtGui.QImage.Format_RGB32,
+        )
+        self.spectrogram_offset = 0
+        self.spectrogram_lut = self.build_spectrogram_lut()
+        self.artwork = None
+
     def load_neural_network(self):
         try:
             print("Loading ResNet18 model...")
@@ -56,6 +72,51 @@ class AdvancedMusicVisualiser(QtWidgets.QGraphicsView):
     def set_visualisation_mode(self, mode):
         print(f"Switching visualisation mode to: {mode}")
         self.visualisation_mode = mode
+        if mode == "spectrogram":
+            self.scene.clear()
+            self.scene.setSceneRect(0, 0, self.spectrogram_width, self.spectrogram_height)
+        self.viewport().update()
+
+    def set_artwork(self, pixmap):
+        # Обложка текущего трека рисуется поверх визуализации
+        self.artwork = pixmap
+        self.viewport().update()
+
+    def build_spectrogram_lut(self):
+        # Палитра чёрный -> фиолетовый -> оранжевый -> жёлтый, в порядке байтов RGB32 (B, G, R, A)
+        anchors = np.array([0, 85, 170, 255])
+        levels = np.arange(256)
+        red = np.interp(levels, anchors, [0, 120, 240, 255])
+        green = np.interp(levels, anchors, [0, 20, 110, 240])
+        blue = np.interp(levels, anchors, [0, 140, 40, 120])
+        return np.stack([blue, green, red, np.full(256, 255)], axis=1).astype(np.uint8)
+
+    def push_spectrogram_column(self, audio_features, volume):
+        if self.repeat_effect:
+            self.pulse_step = (self.pulse_step + 5) % 50
+            volume += self.pulse_step / 100
+        # Низкие частоты внизу: признаки растягиваются на высоту столбца
+        rows = np.interp(
+            np.linspace(len(audio_features) - 1, 0, self.spectrogram_height),
+            np.arange(len(audio_features)),
+            audio_features,
+        )
+        levels = np.clip(rows * volume * 255, 0, 255).astype(np.uint8)
+        self.spectrogram[:, self.spectrogram_offset] = self.spectrogram_lut[levels]
+        self.spectrogram_offset = (self.spectrogram_offset + 1) % self.spectrogram_width
+
+    def drawBackground(self, painter, rect):
+        if self.visualisation_mode != "spectrogram":
+            return super().drawBackground(painter, rect)
+        # Два блита вместо перерисовки: старая часть кольца слева, свежая справа
+        offset = self.spectrogram_offset
+        width = self.spectrogram_width
+        height = self.spectrogram_height
+        painter.drawImage(QtCore.QRectF(0, 0, width - offset, height), self.spectrogram_image, QtCore.QRectF(offset, 0, width - offset, height))
+        if offset:
+            painter.drawImage(QtCore.QRectF(width - offset, 0, offset, height), self.spectrogram_image, QtCore.QRectF(0, 0, offset, height))
+        if self.artwork is not None:
+            painter.drawPixmap(8, 8, self.artwork)
 
     def generate_visual(self, audio_features, volume):
         base_image = Image.new('RGB', (512, 512), (0, 0, 0))
@@ -134,10 +195,18 @@ class AdvancedMusicVisualiser(QtWidgets.QGraphicsView):
     def update_visualisation(self):
         if not self.media_player or self.media_player.state() != QMediaPlayer.PlayingState:
             return
+        with metrics.timer("cecilio_visualiser_frame_seconds", log=False, mode=self.visualisation_mode):
+            self.render_frame()
 
+    def render_frame(self):
         audio_features = np.abs(np.sin(np.linspace(0, np.pi, 30)) + np.random.randn(30) * 0.1)
         volume = self.media_player.volume() / 100
 
+        if self.visualisation_mode == "spectrogram":
+            self.push_spectrogram_column(audio_features, volume)
+            self.viewport().update()
+            return
+
         visual_image = self.generate_visual(audio_features, volume)
         visual_image = visual_image.convert("RGB")
         qt_image = QtGui.QImage(
@@ -151,3 +220,6 @@ class AdvancedMusicVisualiser(QtWidgets.QGraphicsView):
 
         self.scene.clear()
         self.scene.addItem(pixmap_item)
+        if self.artwork is not None:
+            artwork_item = self.scene.addPixmap(self.artwork)
+            artwork_item.setPos((visual_image.width - self.artwork.width()) / 2, (visual_image.height - self.artwork.height()) / 2)
@@ -0,0 +1,245 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+# Бенчмарк гоняется без экрана: offscreen-платформа Qt
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5 import QtCore, QtGui, QtWidgets
+from PyQt5.QtWidgets import QMessageBox
+import cecilio_main
+from cecilio_audio_visualiser import AdvancedMusicVisualiser
+from cecilio_main import CecilioMusicPlayer
+from cecilio_track_store import TrackStore
+
+SIZES = (1000, 10000, 100000)
+RUN_LENGTH = 500
+REPEATS = 3
+BASELINE_TOLERANCE = 1.5
+MEMORY_TOLERANCE = 1.5
+# Пики в несколько килобайт заметно колеблются от запуска к запуску, поэтому есть абсолютный запас
+MEMORY_SLACK_KIB = 64
+SCALING_SLACK = 4
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baselines.json")
+
+
+def synthetic_library(size):
+    # Несколько папок и длинные имена, как у настоящей библиотеки
+    return [
+        f"/music/Artist {i % 40:02d}/Album {i % 9}/{i:06d} - Synthetic Track {i}.mp3"
+        for i in range(size)
+    ]
+
+
+class NullArtworkService(QtCore.QObject):
+    # Заглушка ArtworkService: без пула, ffmpeg и каталога ~/.cecilio/artwork
+    artworkReady = QtCore.pyqtSignal(str, QtGui.QPixmap)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.thumbnail_urls = {}
+
+    def set_thumbnail_url(self, track, url):
+        pass
+
+    def request(self, track):
+        return None
+
+    def cached(self, track):
+        return None
+
+    def cancel_pending(self, keep=None):
+        pass
+
+    def shutdown(self):
+        pass
+
+
+def reset(window, library):
+    engine = window.engine
+    engine.playlist = TrackStore(library)
+    engine.current_index = 0
+    engine.previous_tracks = []
+    engine.shuffle_playlist = []
+    engine.shuffle = False
+    window.shuffle_button.setChecked(False)
+    window.update_playlist()
+
+
+def run_update_playlist(window):
+    window.update_playlist()
+    return 1
+
+
+def run_shuffle_playlist(window):
+    window.shuffle_playlist_action()
+    return 1
+
+
+def run_toggle_shuffle(window):
+    window.shuffle_button.setChecked(True)
+    window.toggle_shuffle()
+    return 1
+
+
+def run_next_track(window):
+    for _ in range(RUN_LENGTH):
+        window.next_track()
+    return RUN_LENGTH
+
+
+def enable_shuffle(window):
+    window.shuffle_button.setChecked(True)
+    window.toggle_shuffle()
+
+
+def run_next_track_shuffled(window):
+    return run_next_track(window)
+
+
+def run_prev_track(window):
+    for _ in range(RUN_LENGTH):
+        window.next_track()
+    for _ in range(RUN_LENGTH):
+        window.prev_track()
+    return 2 * RUN_LENGTH
+
+
+def run_highlight(window):
+    for i in range(RUN_LENGTH):
+        window.current_index = (i * 7919) % len(window.playlist)
+        window.highlight_current_track()
+    return RUN_LENGTH
+
+
+def run_change_language(window):
+    for i in range(RUN_LENGTH):
+        window.change_language("ru" if i % 2 else "en")
+    return RUN_LENGTH
+
+
+# (операция, функция, ожидаемый рост времени на одну операцию от размера плейлиста)
+OPERATIONS = [
+    ("update_playlist", run_update_playlist, "linear"),
+    ("shuffle_playlist_action", run_shuffle_playlist, "linear"),
+    ("toggle_shuffle", run_toggle_shuffle, "linear"),
+    ("next_track", run_next_track, "constant"),
+    ("next_track_shuffled", run_next_track_shuffled, "constant"),
+    ("prev_track", run_prev_track, "constant"),
+    ("highlight_current_track", run_highlight, "constant"),
+    ("change_language", run_change_language, "constant"),
+]
+
+# Подготовка, которая не должна попадать в замер (операция -> функция)
+SETUP = {
+    "next_track_shuffled": enable_shuffle,
+}
+
+
+def prepare(app, window, library, setup):
+    reset(window, library)
+    if setup is not None:
+        setup(window)
+    app.processEvents()
+
+
+def measure(app, window, library, run, setup=None):
+    timings = []
+    for _ in range(REPEATS):
+        prepare(app, window, library, setup)
+        started = time.perf_counter()
+        count = run(window)
+        timings.append((time.perf_counter() - started) / count)
+        app.processEvents()
+    # Память отдельным проходом: tracemalloc заметно замедляет Python-код.
+    # Пик считается за весь прогон операции: делить его на число вызовов бессмысленно
+    prepare(app, window, library, setup)
+    tracemalloc.start()
+    run(window)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    app.processEvents()
+    return statistics.median(timings), peak / 1024
+
+
+def check_scaling(results, sizes):
+    failures = []
+    smallest, largest = min(sizes), max(sizes)
+    for name, _, complexity in OPERATIONS:
+        growth = results[f"{name}@{largest}"]["seconds"] / results[f"{name}@{smallest}"]["seconds"]
+        expected = largest / smallest if complexity == "linear" else 1
+        if growth > expected * SCALING_SLACK:
+            failures.append(
+                f"SCALING REGRESSION {name}: {growth:.1f}x slower per call from {smallest} to {largest} tracks "
+                f"(expected {complexity}, allowed {expected * SCALING_SLACK:.0f}x)"
+            )
+    return failures
+
+
+def check_baselines(results, baselines, tolerance, memory_tolerance):
+    failures = []
+    for key, result in results.items():
+        baseline = baselines.get(key)
+        if not baseline:
+            continue
+        if result["seconds"] > baseline["seconds"] * tolerance:
+            failures.append(
+                f"BASELINE REGRESSION {key}: {result['seconds'] * 1e6:.1f} us per call, "
+                f"baseline {baseline['seconds'] * 1e6:.1f} us (tolerance {tolerance}x)"
+            )
+        if "peak_kib" in baseline and result["peak_kib"] > baseline["peak_kib"] * memory_tolerance + MEMORY_SLACK_KIB:
+            failures.append(
+                f"MEMORY REGRESSION {key}: peak {result['peak_kib']:.1f} KiB, "
+                f"baseline {baseline['peak_kib']:.1f} KiB (tolerance {memory_tolerance}x + {MEMORY_SLACK_KIB} KiB)"
+            )
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cecilio playlist operations benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES), help="synthetic library sizes")
+    parser.add_argument("--baselines", default=BASELINE_PATH, help="JSON file with stored baselines")
+    parser.add_argument("--tolerance", type=float, default=BASELINE_TOLERANCE, help="allowed slowdown against baseline")
+    parser.add_argument("--memory-tolerance", type=float, default=MEMORY_TOLERANCE, help="allowed peak memory growth against baseline")
+    parser.add_argument("--update-baselines", action="store_true", help="store this run as the new baselines")
+    args = parser.parse_args()
+
+    # Без сети, модальных окон и обложек: меряем только сам плеер
+    AdvancedMusicVisualiser.load_neural_network = lambda self: None
+    QMessageBox.information = QMessageBox.warning = staticmethod(lambda *args, **kwargs: QMessageBox.Ok)
+    cecilio_main.ArtworkService = NullArtworkService
+    app = QtWidgets.QApplication(sys.argv[:1])
+    window = CecilioMusicPlayer()
+
+    results = {}
+    print(f"{'operation':<26}{'tracks':>8}{'us/call':>14}{'peak KiB':>12}")
+    for size in sorted(args.sizes):
+        library = synthetic_library(size)
+        for name, run, _ in OPERATIONS:
+            seconds, kib = measure(app, window, library, run, SETUP.get(name))
+            results[f"{name}@{size}"] = {"seconds": seconds, "peak_kib": kib}
+            print(f"{name:<26}{size:>8}{seconds * 1e6:>14.1f}{kib:>12.1f}")
+    window.artwork.shutdown()
+
+    failures = check_scaling(results, args.sizes) if len(args.sizes) > 1 else []
+    if args.update_baselines:
+        with open(args.baselines, "w") as baseline_file:
+            json.dump(results, baseline_file, indent=2, sort_keys=True)
+        print(f"Baselines written to {args.baselines}")
+    elif os.path.exists(args.baselines):
+        with open(args.baselines, "r") as baseline_file:
+            failures += check_baselines(results, json.load(baseline_file), args.tolerance, args.memory_tolerance)
+    else:
+        print(f"No baselines at {args.baselines}; run with --update-baselines to store them.")
+
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,424 @@
+import argparse
+import json
+import random
+import signal
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from PyQt5 import QtCore, QtNetwork
+from PyQt5.QtMultimedia import QMediaPlayer, QMediaContent
+from cecilio_streaming import resolve_stream, media_url
+from cecilio_metrics import MediaPlayerMonitor, configure_metrics
+from cecilio_track_store import TrackStore, FLAG_PLAYED
+
+DEFAULT_SOCKET_NAME = "cecilio-player"
+
+
+def dsp_options(block_size=None, block_count=None, output_blocks=None):
+    # Размеры буферов DSP-движка из командной строки; незаданные остаются по умолчанию
+    options = {"block_size": block_size, "block_count": block_count, "output_blocks": output_blocks}
+    return {name: int(value) for name, value in options.items() if value is not None}
+
+
+class BackgroundTasks(QtCore.QObject):
+    # Блокирующая работа уходит в пул, а callback вызывается в потоке владельца через сигнал
+    finished = QtCore.pyqtSignal(object, object, object)
+
+    def __init__(self, workers=2, parent=None):
+        super().__init__(parent)
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.finished.connect(self.deliver)
+
+    def run(self, callback, function, *args):
+        self.pool.submit(self.call, callback, function, args)
+
+    def call(self, callback, function, args):
+        try:
+            result, error = function(*args), None
+        except Exception as e:
+            result, error = None, e
+        self.finished.emit(callback, result, error)
+
+    def deliver(self, callback, result, error):
+        callback(result, error)
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+class CecilioPlayerEngine(QtCore.QObject):
+    # Движок плеера без виджетов: очередь, QMediaPlayer и стриминг
+    trackChanged = QtCore.pyqtSignal(int)
+    playlistChanged = QtCore.pyqtSignal()
+
+    def __init__(self, parent=None, dsp_engine=False, dsp_options=None):
+        super().__init__(parent)
+        if dsp_engine:
+            from cecilio_dsp_engine import DSPPlaybackEngine
+            self.media_player = DSPPlaybackEngine(self, **(dsp_options or {}))
+        else:
+            self.media_player = QMediaPlayer(None, QMediaPlayer.StreamPlayback)
+        self.playlist = TrackStore()
+        self.previous_tracks = []
+        self.shuffle_playlist = []
+        self.current_index = -1
+        self.repeat = False
+        self.shuffle = False
+        self.tasks = BackgroundTasks(parent=self)
+        # Монитор подключается первым, чтобы видеть EndOfMedia раньше переключения трека
+        self.monitor = MediaPlayerMonitor(self.media_player, self)
+        self.media_player.mediaStatusChanged.connect(self.handle_media_end)
+        self.media_player.durationChanged.connect(self.store_duration)
+
+    def is_playing(self):
+        return self.media_player.state() == QMediaPlayer.PlayingState
+
+    def play(self):
+        if self.current_index == -1 and self.playlist:
+            self.current_index = 0
+        if not self.playlist or self.current_index == -1:
+            return False
+        url = media_url(self.playlist[self.current_index])
+        self.playlist.set_flag(self.current_index, FLAG_PLAYED)
+        if self.media_player.media().canonicalUrl() != url:
+            self.media_player.setMedia(QMediaContent(url))
+            self.trackChanged.emit(self.current_index)
+        self.media_player.play()
+        return True
+
+    def pause(self):
+        self.media_player.pause()
+        return True
+
+    def play_pause(self):
+        if self.is_playing():
+            return self.pause()
+        return self.play()
+
+    def next_track(self):
+        if not self.playlist:
+            return False
+        self.previous_tracks.append(self.current_index)
+        if self.shuffle:
+            if not self.shuffle_playlist:
+                self.generate_shuffle_playlist()
+            self.current_index = self.shuffle_playlist.pop()
+        else:
+            self.current_index = (self.current_index + 1) % len(self.playlist)
+        return self.play()
+
+    def prev_track(self):
+        if not self.playlist:
+            return False
+        if self.previous_tracks:
+            self.current_index = self.previous_tracks.pop()
+        else:
+            if self.media_player.position() > 5000:
+                self.media_player.setPosition(0)
+                return True
+            self.current_index = (self.current_index - 1) % len(self.playlist)
+        return self.play()
+
+    def seek(self, position):
+        self.media_player.setPosition(int(position))
+        return True
+
+    def set_volume(self, volume):
+        self.media_player.setVolume(max(0, min(100, int(volume))))
+        return True
+
+    def set_shuffle(self, enabled):
+        self.shuffle = bool(enabled)
+        if self.shuffle:
+            self.generate_shuffle_playlist()
+        return True
+
+    def set_repeat(self, enabled):
+        self.repeat = bool(enabled)
+        return True
+
+    def generate_shuffle_playlist(self):
+        self.shuffle_playlist = random.sample(range(len(self.playlist)), len(self.playlist))
+
+    def shuffle_playlist_action(self):
+        if not self.playlist:
+            return False
+        self.playlist.shuffle()
+        self.previous_tracks = []
+        self.current_index = 0
+        self.playlist_updated()
+        return self.play()
+
+    def enqueue(self, track):
+        self.playlist.append(track)
+        self.playlist_updated()
+        return len(self.playlist) - 1
+
+    def enqueue_many(self, tracks, replace=False):
+        if replace:
+            self.media_player.stop()
+            self.playlist = TrackStore(tracks)
+            self.previous_tracks = []
+            self.current_index = 0 if self.playlist else -1
+        else:
+            self.playlist.extend(tracks)
+        self.playlist_updated()
+        return len(self.playlist)
+
+    def enqueue_stream(self, provider, url, callback):
+        # Разрешение ссылки ходит в сеть: выполняется в пуле, callback получает (индекс, ошибка)
+        def enqueue_resolved(stream, error):
+            if error is not None:
+                return callback(None, error)
+            callback(self.enqueue(stream.stream_url), None)
+
+        self.tasks.run(enqueue_resolved, resolve_stream, provider, url)
+
+    def playlist_updated(self):
+        if self.shuffle:
+            self.generate_shuffle_playlist()
+        self.playlistChanged.emit()
+
+    def handle_media_end(self, status):
+        if status == QMediaPlayer.EndOfMedia:
+            if self.repeat:
+                self.media_player.setPosition(0)
+                self.media_player.play()
+            else:
+                self.next_track()
+
+    def store_duration(self, duration):
+        if duration > 0 and 0 <= self.current_index < len(self.playlist):
+            self.playlist.set_duration(self.current_index, duration)
+
+    def status(self):
+        return {
+            "state": "playing" if self.is_playing() else "paused",
+            "index": self.current_index,
+            "track": self.playlist[self.current_index] if 0 <= self.current_index < len(self.playlist) else None,
+            "length": len(self.playlist),
+            "position": self.media_player.position(),
+            "duration": self.media_player.duration(),
+            "volume": self.media_player.volume(),
+            "shuffle": self.shuffle,
+            "repeat": self.repeat,
+            "underruns": getattr(self.media_player, "underruns", 0),
+        }
+
+
+class CecilioControlServer(QtCore.QObject):
+    # Протокол: одна JSON-строка на команду, {"id": 1, "cmd": "next", "args": {...}}
+    # Ответ: {"id": 1, "ok": true, "result": ...} или {"id": 1, "ok": false, "error": "..."}
+    def __init__(self, engine, socket_name=DEFAULT_SOCKET_NAME, parent=None):
+        super().__init__(parent)
+        self.engine = engine
+        self.socket_name = socket_name
+        self.server = QtNetwork.QLocalServer(self)
+        self.server.newConnection.connect(self.accept_connections)
+        self.buffers = {}
+        self.commands = {
+            "play": lambda args: engine.play(),
+            "pause": lambda args: engine.pause(),
+            "toggle": lambda args: engine.play_pause(),
+            "next": lambda args: engine.next_track(),
+            "prev": lambda args: engine.prev_track(),
+            "seek": lambda args: engine.seek(args["position"]),
+            "volume": lambda args: engine.set_volume(args["volume"]),
+            "shuffle": lambda args: engine.set_shuffle(args["enabled"]),
+            "repeat": lambda args: engine.set_repeat(args["enabled"]),
+            "shuffle_playlist": lambda args: engine.shuffle_playlist_action(),
+            "batch_enqueue": lambda args: engine.enqueue_many(args["tracks"], args.get("replace", False)),
+            "status": lambda args: engine.status(),
+            "playlist": lambda args: list(engine.playlist),
+            "equaliser": self.set_equaliser,
+        }
+        # Эти команды отвечают позже через respond(result, error), не блокируя цикл событий
+        self.deferred_commands = {
+            "enqueue": self.enqueue,
+        }
+
+    def listen(self):
+        probe = QtNetwork.QLocalSocket()
+        probe.connectToServer(self.socket_name)
+        if probe.waitForConnected(500):
+            probe.disconnectFromServer()
+            raise RuntimeError(f"Another daemon is already listening on {self.socket_name}")
+        # Никто не отвечает: сокет остался от упавшего демона, его можно убрать
+        QtNetwork.QLocalServer.removeServer(self.socket_name)
+        if not self.server.listen(self.socket_name):
+            raise RuntimeError(f"Cannot listen on {self.socket_name}: {self.server.errorString()}")
+        return self.server.fullServerName()
+
+    def enqueue(self, args, respond):
+        if "provider" in args:
+            return self.engine.enqueue_stream(args["provider"], args["url"], respond)
+        respond(self.engine.enqueue(args["track"]))
+
+    def set_equaliser(self, args):
+        if not hasattr(self.engine.media_player, "set_equaliser_gains"):
+            raise ValueError("Equaliser requires the DSP engine (--dsp)")
+        if "preset" in args:
+            self.engine.media_player.set_equaliser_preset(args["preset"])
+        else:
+            self.engine.media_player.set_equaliser_gains(args["gains"])
+        return True
+
+    def accept_connections(self):
+        while self.server.hasPendingConnections():
+            socket = self.server.nextPendingConnection()
+            self.buffers[socket] = b""
+            socket.readyRead.connect(lambda socket=socket: self.read_commands(socket))
+            socket.disconnected.connect(lambda socket=socket: self.drop_connection(socket))
+
+    def drop_connection(self, socket):
+        self.buffers.pop(socket, None)
+        socket.deleteLater()
+
+    def read_commands(self, socket):
+        data = self.buffers.get(socket, b"") + bytes(socket.readAll())
+        *lines, self.buffers[socket] = data.split(b"\n")
+        for line in lines:
+            if line.strip():
+                self.dispatch(line, lambda reply, socket=socket: self.send_reply(socket, reply))
+
+    def send_reply(self, socket, reply):
+        # Отложенный ответ может прийти после отключения клиента
+        if socket not in self.buffers:
+            return
+        socket.write(json.dumps(reply).encode("utf-8") + b"\n")
+        socket.flush()
+
+    def dispatch(self, line, send):
+        request_id = None
+
+        def respond(result, error=None):
+            if error is None:
+                send({"id": request_id, "ok": True, "result": result})
+            else:
+                send({"id": request_id, "ok": False, "error": str(error)})
+
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            cmd, args = request.get("cmd"), request.get("args") or {}
+            if cmd in self.deferred_commands:
+                return self.deferred_commands[cmd](args, respond)
+            handler = self.commands.get(cmd)
+            if handler is None:
+                raise ValueError(f"Unknown command: {cmd}")
+            respond(handler(args))
+        except Exception as e:
+            respond(None, e)
+
+
+class CecilioControlClient(QtCore.QObject):
+    # Асинхронный клиент: ответы читаются по readyRead и передаются в callback(result, error) по id запроса,
+    # поэтому поток GUI не ждёт демона, пока тот, например, разрешает ссылку на стрим
+    def __init__(self, socket_name=DEFAULT_SOCKET_NAME, parent=None):
+        super().__init__(parent)
+        self.socket_name = socket_name
+        self.socket = QtNetwork.QLocalSocket(self)
+        self.socket.readyRead.connect(self.read_replies)
+        self.socket.disconnected.connect(self.drop_pending)
+        self.buffer = b""
+        self.next_id = 0
+        self.pending = {}
+        self.timeout_timer = QtCore.QTimer(self)
+        self.timeout_timer.timeout.connect(self.expire_requests)
+
+    def connect_to_daemon(self, timeout=1000):
+        self.socket.connectToServer(self.socket_name)
+        if not self.socket.waitForConnected(timeout):
+            raise ConnectionError(f"Cannot connect to {self.socket_name}: {self.socket.errorString()}")
+
+    def send(self, cmd, callback, timeout=5000, **args):
+        if self.socket.state() != QtNetwork.QLocalSocket.ConnectedState:
+            callback(None, ConnectionError(f"Not connected to {self.socket_name}"))
+            return
+        self.next_id += 1
+        self.pending[self.next_id] = (callback, cmd, time.monotonic() + timeout / 1000)
+        self.socket.write(json.dumps({"id": self.next_id, "cmd": cmd, "args": args}).encode("utf-8") + b"\n")
+        self.socket.flush()
+        if not self.timeout_timer.isActive():
+            self.timeout_timer.start(250)
+
+    def read_replies(self):
+        self.buffer += bytes(self.socket.readAll())
+        *lines, self.buffer = self.buffer.split(b"\n")
+        for line in lines:
+            if not line.strip():
+                continue
+            reply = json.loads(line)
+            # Ответ на просроченный запрос уже никому не нужен
+            callback, _, _ = self.pending.pop(reply.get("id"), (None, None, None))
+            if callback is None:
+                continue
+            if reply.get("ok"):
+                callback(reply.get("result"), None)
+            else:
+                callback(None, RuntimeError(reply.get("error")))
+
+    def expire_requests(self):
+        now = time.monotonic()
+        for request_id, (callback, cmd, deadline) in list(self.pending.items()):
+            if deadline <= now and self.pending.pop(request_id, None) is not None:
+                callback(None, TimeoutError(f"No reply to '{cmd}' from {self.socket_name}"))
+        if not self.pending:
+            self.timeout_timer.stop()
+
+    def drop_pending(self):
+        pending, self.pending = self.pending, {}
+        self.timeout_timer.stop()
+        for callback, _, _ in pending.values():
+            callback(None, ConnectionError(f"Lost connection to {self.socket_name}"))
+
+
+class RemotePlayerState:
+    # Состояние плеера демона по последнему ответу status: state() и volume(), как у QMediaPlayer,
+    # чтобы визуализатор подключённого GUI работал так же, как с локальным плеером
+    def __init__(self):
+        self.status = {}
+
+    def state(self):
+        return QMediaPlayer.PlayingState if self.status.get("state") == "playing" else QMediaPlayer.PausedState
+
+    def volume(self):
+        return self.status.get("volume", 100)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cecilio Music Player headless daemon")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET_NAME, help="local socket name to listen on")
+    parser.add_argument("--dsp", action="store_true", help="play through the NumPy/SciPy DSP engine with equaliser")
+    parser.add_argument("--dsp-block-size", type=int, default=None, help="frames per DSP block (default 1024)")
+    parser.add_argument("--dsp-blocks", type=int, default=None, help="blocks in the decoder ring buffer (default 32)")
+    parser.add_argument("--dsp-output-blocks", type=int, default=None, help="blocks in the audio output buffer (default 4)")
+    parser.add_argument("--metrics-port", type=int, default=None, help="serve Prometheus metrics on localhost:PORT")
+    parser.add_argument("--metrics-log", default=None, help="write metrics as rotating JSON lines to this file")
+    parser.add_argument("tracks", nargs="*", help="files or URLs to enqueue on start")
+    args = parser.parse_args()
+
+    app = QtCore.QCoreApplication(sys.argv)
+    configure_metrics(args.metrics_port, args.metrics_log)
+    signal.signal(signal.SIGINT, lambda *_: app.quit())
+    # Даём интерпретатору Python обработать Ctrl+C внутри цикла событий Qt
+    interrupt_timer = QtCore.QTimer()
+    interrupt_timer.timeout.connect(lambda: None)
+    interrupt_timer.start(500)
+    engine = CecilioPlayerEngine(
+        dsp_engine=args.dsp, dsp_options=dsp_options(args.dsp_block_size, args.dsp_blocks, args.dsp_output_blocks)
+    )
+    app.aboutToQuit.connect(engine.tasks.shutdown)
+    server = CecilioControlServer(engine, args.socket)
+    try:
+        print(f"Cecilio daemon listening on {server.listen()}")
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 1
+    if args.tracks:
+        engine.enqueue_many(args.tracks)
+    return app.exec_()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,457 @@
+import subprocess
+import threading
+import numpy as np
+from scipy.signal import sosfilt
+from pydub.utils import get_encoder_name, mediainfo
+from PyQt5 import QtCore
+from PyQt5.QtMultimedia import QAudio, QAudioFormat, QAudioOutput, QMediaContent, QMediaPlayer
+from cecilio_metrics import metrics
+
+# Полосы эквалайзера (Гц) и пресеты усиления (дБ) для каждой полосы
+EQ_BANDS = (31, 62, 125, 250, 500, 1000, 2000, 4000, 8000, 16000)
+EQ_PRESETS = {
+    "flat": (0, 0, 0, 0, 0, 0, 0, 0, 0, 0),
+    "bass": (6, 5, 4, 2, 0, 0, 0, 0, 0, 0),
+    "treble": (0, 0, 0, 0, 0, 0, 2, 4, 5, 6),
+    "vocal": (-2, -2, -1, 0, 2, 4, 4, 2, 0, -1),
+}
+
+
+def decode_process(source, sample_rate, channels, start_ms=0):
+    # ffmpeg (тот же, что использует pydub) декодирует файл или URL потоком в float32
+    command = [
+        get_encoder_name(), "-nostdin", "-loglevel", "error",
+        "-ss", f"{start_ms / 1000:.3f}", "-i", source,
+        "-f", "f32le", "-acodec", "pcm_f32le", "-ac", str(channels), "-ar", str(sample_rate), "-",
+    ]
+    return subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+
+def read_blocks(process, block_size, channels):
+    block_bytes = block_size * channels * 4
+    while True:
+        data = process.stdout.read(block_bytes)
+        if not data:
+            return
+        frames = len(data) // (channels * 4)
+        yield np.frombuffer(data[:frames * channels * 4], dtype=np.float32).reshape(frames, channels)
+
+
+def peaking_sos(frequencies, gains_db, sample_rate, q=1.41):
+    # Пиковые бикводы (RBJ cookbook), все полосы сразу в форме second-order sections
+    frequencies = np.asarray(frequencies, dtype=np.float64)
+    a = 10 ** (np.asarray(gains_db, dtype=np.float64) / 40)
+    w0 = 2 * np.pi * frequencies / sample_rate
+    alpha = np.sin(w0) / (2 * q)
+    cos_w0 = np.cos(w0)
+    a0 = 1 + alpha / a
+    sos = np.empty((len(frequencies), 6))
+    sos[:, 0] = (1 + alpha * a) / a0
+    sos[:, 1] = -2 * cos_w0 / a0
+    sos[:, 2] = (1 - alpha * a) / a0
+    sos[:, 3] = 1
+    sos[:, 4] = -2 * cos_w0 / a0
+    sos[:, 5] = (1 - alpha / a) / a0
+    return sos
+
+
+class MultiBandEqualiser:
+    def __init__(self, sample_rate, channels, bands=EQ_BANDS):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.band_count = len(bands)
+        self.bands = tuple(f for f in bands if f < sample_rate / 2)
+        self.gains = np.zeros(len(self.bands))
+        self.sos = peaking_sos(self.bands, self.gains, sample_rate)
+        self.zi = np.zeros((len(self.bands), 2, channels))
+        self.lock = threading.Lock()
+
+    def set_gains(self, gains_db):
+        gains = np.asarray(gains_db, dtype=np.float64)
+        # Усиление задаётся для всех полос; полосы выше частоты Найквиста отбрасываются
+        if gains.shape != (self.band_count,):
+            raise ValueError(f"Expected {self.band_count} equaliser gains, got {gains.size}")
+        with self.lock:
+            self.gains = gains[:len(self.bands)]
+            # Состояние фильтров сохраняется, чтобы смена пресета не давала щелчка
+            self.sos = peaking_sos(self.bands, self.gains, self.sample_rate)
+
+    def reset(self):
+        with self.lock:
+            self.zi[:] = 0
+
+    def process(self, block):
+        with self.lock:
+            # Фильтр работает и на плоском пресете (тождественный SOS), чтобы zi не устаревало
+            # и переключение между пресетом и flat проходило без щелчка
+            out, self.zi = sosfilt(self.sos, block, axis=0, zi=self.zi)
+        return out.astype(np.float32, copy=False)
+
+
+class Limiter:
+    def __init__(self, threshold=0.95, release=0.2):
+        self.threshold = threshold
+        self.release = release
+        self.gain = 1.0
+
+    def process(self, block):
+        peak = np.abs(block).max() if len(block) else 0.0
+        target = min(1.0, self.threshold / peak) if peak > 0 else 1.0
+        # Атака мгновенная, отпускание плавное; усиление линейно интерполируется по блоку
+        if target > self.gain:
+            target = self.gain + (target - self.gain) * self.release
+        ramp = np.linspace(self.gain, target, len(block), dtype=np.float32)
+        self.gain = target
+        return np.clip(block * ramp[:, None], -self.threshold, self.threshold)
+
+
+class BlockRingBuffer:
+    def __init__(self, block_count, block_size, channels):
+        self.blocks = np.zeros((block_count, block_size, channels), dtype=np.float32)
+        self.lengths = np.zeros(block_count, dtype=np.int64)
+        self.block_count = block_count
+        self.read_block = 0
+        self.read_offset = 0
+        self.filled = 0
+        self.condition = threading.Condition()
+        self.closed = False
+
+    def write(self, block):
+        with self.condition:
+            while self.filled == self.block_count and not self.closed:
+                self.condition.wait()
+            if self.closed:
+                return False
+            slot = (self.read_block + self.filled) % self.block_count
+            self.blocks[slot, :len(block)] = block
+            self.lengths[slot] = len(block)
+            self.filled += 1
+            return True
+
+    def read(self, out):
+        # Копирует до len(out) кадров в out, возвращает число скопированных кадров
+        copied = 0
+        with self.condition:
+            while copied < len(out) and self.filled:
+                length = self.lengths[self.read_block]
+                count = min(length - self.read_offset, len(out) - copied)
+                out[copied:copied + count] = self.blocks[self.read_block, self.read_offset:self.read_offset + count]
+                copied += count
+                self.read_offset += count
+                if self.read_offset == length:
+                    self.read_block = (self.read_block + 1) % self.block_count
+                    self.read_offset = 0
+                    self.filled -= 1
+            self.condition.notify_all()
+        return copied
+
+    def clear(self, close=False):
+        with self.condition:
+            self.read_block = 0
+            self.read_offset = 0
+            self.filled = 0
+            self.closed = close
+            self.condition.notify_all()
+
+
+class DecoderSession:
+    # Один запуск декодера со своим буфером и флагами; остановленную сессию никто не ждёт,
+    # поток сам завершится, а его события отбрасываются по номеру поколения
+    def __init__(self, generation, ring):
+        self.generation = generation
+        self.ring = ring
+        self.stop = threading.Event()
+        self.finished = threading.Event()
+        self.process = None
+        self.lock = threading.Lock()
+
+    def start_process(self, source, sample_rate, channels, start_ms):
+        with self.lock:
+            if self.stop.is_set():
+                return None
+            self.process = decode_process(source, sample_rate, channels, start_ms)
+            return self.process
+
+    def cancel(self):
+        with self.lock:
+            self.stop.set()
+            if self.process is not None and self.process.poll() is None:
+                self.process.kill()
+        self.ring.clear(close=True)
+
+
+class PCMRingDevice(QtCore.QIODevice):
+    # Источник для QAudioOutput в pull-режиме: float32 из кольцевого буфера -> эквалайзер и лимитер -> int16.
+    # Обработка после буфера, поэтому смена пресета слышна через длину буфера QAudioOutput, а не всего кольца
+    def __init__(self, engine):
+        super().__init__()
+        self.engine = engine
+        self.scratch = np.zeros((engine.block_size, engine.channels), dtype=np.float32)
+
+    def readData(self, maxlen):
+        engine = self.engine
+        frames = maxlen // (engine.channels * 2)
+        if len(self.scratch) < frames:
+            self.scratch = np.zeros((frames, engine.channels), dtype=np.float32)
+        out = self.scratch[:frames]
+        copied = engine.ring.read(out)
+        if copied:
+            out[:copied] = engine.limiter.process(engine.equaliser.process(out[:copied]))
+        if copied < frames:
+            if engine.session is None or engine.session.finished.is_set():
+                frames = copied
+            else:
+                # Пока буфер заполняется после загрузки или перемотки, тишина не считается провалом
+                if not engine.priming:
+                    engine.count_underrun()
+                out[copied:] = 0
+        engine.frames_played += copied
+        return (out[:frames] * 32767).astype("<i2").tobytes()
+
+    def writeData(self, data):
+        return -1
+
+    def bytesAvailable(self):
+        return self.engine.ring.filled * self.engine.block_size * self.engine.channels * 2 + super().bytesAvailable()
+
+    def isSequential(self):
+        return True
+
+
+class DSPPlaybackEngine(QtCore.QObject):
+    # Замена QMediaPlayer с обработкой сэмплов; сигналы и методы совпадают с теми, что использует плеер
+    positionChanged = QtCore.pyqtSignal("qint64")
+    durationChanged = QtCore.pyqtSignal("qint64")
+    mediaStatusChanged = QtCore.pyqtSignal(int)
+    stateChanged = QtCore.pyqtSignal(int)
+    decoderEvent = QtCore.pyqtSignal(int, str, "qint64")
+
+    def __init__(self, parent=None, sample_rate=44100, channels=2, block_size=1024, block_count=32, output_blocks=4):
+        super().__init__(parent)
+        if min(block_size, block_count, output_blocks) < 1:
+            raise ValueError("DSP block size and block counts must be at least 1")
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.block_size = block_size
+        self.block_count = block_count
+        self.output_blocks = output_blocks
+        # Сколько блоков декодировать до BufferedMedia; при block_count=1 — хотя бы один
+        self.prime_blocks = max(1, block_count // 2)
+        self.ring = BlockRingBuffer(block_count, block_size, channels)
+        self.equaliser = MultiBandEqualiser(sample_rate, channels)
+        self.limiter = Limiter()
+        self.underruns = 0
+        self.frames_played = 0
+        self.output_frames = 0
+        self.start_ms = 0
+        self._duration = 0
+        self._volume = 100
+        self._state = QMediaPlayer.StoppedState
+        self._status = QMediaPlayer.NoMedia
+        self._media = QMediaContent()
+        self.session = None
+        self.generation = 0
+        self.priming = False
+
+        audio_format = QAudioFormat()
+        audio_format.setSampleRate(sample_rate)
+        audio_format.setChannelCount(channels)
+        audio_format.setSampleSize(16)
+        audio_format.setCodec("audio/pcm")
+        audio_format.setByteOrder(QAudioFormat.LittleEndian)
+        audio_format.setSampleType(QAudioFormat.SignedInt)
+        self.output = QAudioOutput(audio_format, self)
+        self.output.setBufferSize(output_blocks * block_size * channels * 2)
+        self.output.stateChanged.connect(self.handle_output_state)
+        self.device = PCMRingDevice(self)
+        self.device.open(QtCore.QIODevice.ReadOnly)
+
+        self.decoderEvent.connect(self.handle_decoder_event)
+        self.position_timer = QtCore.QTimer(self)
+        self.position_timer.timeout.connect(self.tick)
+        self.position_timer.start(100)
+
+    def buffered_frames(self):
+        # Кадры, уже отданные QAudioOutput, но ещё не прозвучавшие; bytesFree() верен только в Active/Idle
+        if self.output.state() in (QAudio.ActiveState, QAudio.IdleState):
+            self.output_frames = max(0, self.output.bufferSize() - self.output.bytesFree()) // (self.channels * 2)
+        return self.output_frames
+
+    def count_underrun(self):
+        self.underruns += 1
+        metrics.inc("cecilio_dsp_underruns_total")
+
+    def handle_output_state(self, state):
+        # Провал на стороне устройства: readData вызвали слишком поздно и буфер QAudioOutput опустел.
+        # В конце трека устройство тоже уходит в Idle, это провалом не считается
+        if state != QAudio.IdleState or self.output.error() != QAudio.UnderrunError:
+            return
+        if self._state != QMediaPlayer.PlayingState or self.priming:
+            return
+        if self.session is None or (self.session.finished.is_set() and not self.ring.filled):
+            return
+        self.count_underrun()
+
+    def latency_ms(self):
+        return (self.block_count + self.output_blocks) * self.block_size * 1000 / self.sample_rate
+
+    def set_equaliser_gains(self, gains_db):
+        self.equaliser.set_gains(gains_db)
+
+    def set_equaliser_preset(self, name):
+        if name not in EQ_PRESETS:
+            raise ValueError(f"Unknown equaliser preset: {name} (available: {', '.join(EQ_PRESETS)})")
+        self.equaliser.set_gains(EQ_PRESETS[name])
+
+    # --- API QMediaPlayer ---
+    def media(self):
+        return self._media
+
+    def setMedia(self, content):
+        self.stop()
+        self._media = content
+        self._duration = 0
+        self.durationChanged.emit(0)
+        self.start_decoder(0, QMediaPlayer.LoadingMedia)
+
+    def play(self):
+        if self._media.isNull():
+            return
+        if self._status == QMediaPlayer.EndOfMedia or self.session is None:
+            self.setPosition(0)
+        if self.output.state() == QAudio.SuspendedState:
+            self.output.resume()
+        elif self.output.state() != QAudio.ActiveState:
+            self.output.start(self.device)
+        self.set_state(QMediaPlayer.PlayingState)
+
+    def pause(self):
+        self.output.suspend()
+        self.set_state(QMediaPlayer.PausedState)
+
+    def stop(self):
+        self.stop_decoder()
+        self.output.stop()
+        self.frames_played = 0
+        self.output_frames = 0
+        self.start_ms = 0
+        self.set_state(QMediaPlayer.StoppedState)
+
+    def state(self):
+        return self._state
+
+    def mediaStatus(self):
+        return self._status
+
+    def position(self):
+        return self.start_ms + max(0, self.frames_played - self.buffered_frames()) * 1000 // self.sample_rate
+
+    def setPosition(self, position):
+        if self._media.isNull():
+            return
+        self.start_decoder(max(0, int(position)))
+        self.positionChanged.emit(self.position())
+
+    def duration(self):
+        return self._duration
+
+    def volume(self):
+        return self._volume
+
+    def setVolume(self, volume):
+        self._volume = max(0, min(100, int(volume)))
+        self.output.setVolume(self._volume / 100)
+
+    # --- Декодер ---
+    def start_decoder(self, start_ms, status=None):
+        self.stop_decoder()
+        # Новый буфер на каждый запуск: старый поток может ещё дописывать в свой
+        self.ring = BlockRingBuffer(self.block_count, self.block_size, self.channels)
+        self.equaliser.reset()
+        self.start_ms = start_ms
+        self.frames_played = 0
+        self.output_frames = 0
+        self.generation += 1
+        self.session = DecoderSession(self.generation, self.ring)
+        self.priming = True
+        # Перемотка не меняет статус: иначе в метриках она выглядела бы как новая загрузка
+        if status is not None:
+            self.set_status(status)
+        source = self._media.canonicalUrl()
+        source = source.toLocalFile() if source.isLocalFile() else source.toString()
+        threading.Thread(target=self.decode, args=(self.session, source, start_ms), daemon=True).start()
+
+    def stop_decoder(self):
+        # Без join: поток может сидеть в mediainfo (ffprobe), GUI-поток его не ждёт
+        if self.session is None:
+            return
+        self.session.cancel()
+        self.session = None
+
+    def decode(self, session, source, start_ms):
+        process = None
+        try:
+            if start_ms == 0:
+                duration = int(float(mediainfo(source).get("duration", 0)) * 1000)
+                self.decoderEvent.emit(session.generation, "duration", duration)
+            process = session.start_process(source, self.sample_rate, self.channels, start_ms)
+            if process is None:
+                return
+            written = 0
+            for block in read_blocks(process, self.block_size, self.channels):
+                if session.stop.is_set():
+                    return
+                if not session.ring.write(block):
+                    return
+                written += 1
+                if written == self.prime_blocks:
+                    self.decoderEvent.emit(session.generation, "buffered", 0)
+            if process.wait() != 0 and not written:
+                self.decoderEvent.emit(session.generation, "invalid", 0)
+                return
+            if written < self.prime_blocks:
+                self.decoderEvent.emit(session.generation, "buffered", 0)
+        except Exception as e:
+            if not session.stop.is_set():
+                print(f"Error decoding media: {e}")
+                self.decoderEvent.emit(session.generation, "invalid", 0)
+        finally:
+            if process is not None and process.poll() is None:
+                process.kill()
+            session.finished.set()
+
+    def handle_decoder_event(self, generation, event, value):
+        if generation != self.generation:
+            return
+        if event == "duration":
+            self._duration = value
+            self.durationChanged.emit(value)
+        elif event == "buffered":
+            self.priming = False
+            self.set_status(QMediaPlayer.BufferedMedia)
+        elif event == "invalid":
+            self.set_status(QMediaPlayer.InvalidMedia)
+
+    def tick(self):
+        if self._state != QMediaPlayer.PlayingState:
+            return
+        self.positionChanged.emit(self.position())
+        if self.session is None or not self.session.finished.is_set() or self.ring.filled:
+            return
+        # Кольцо пусто, но в буфере QAudioOutput ещё звучит хвост трека: останавливаться рано
+        if self.output.state() != QAudio.IdleState and self.buffered_frames() > 0:
+            return
+        if self._status != QMediaPlayer.InvalidMedia:
+            self.output.stop()
+            self.set_state(QMediaPlayer.StoppedState)
+            self.set_status(QMediaPlayer.EndOfMedia)
+
+    def set_state(self, state):
+        if state != self._state:
+            self._state = state
+            self.stateChanged.emit(state)
+
+    def set_status(self, status):
+        if status != self._status:
+            self._status = status
+            self.mediaStatusChanged.emit(status)
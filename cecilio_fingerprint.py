@@ -0,0 +1,267 @@
+import argparse
+import itertools
+import os
+import sqlite3
+import sys
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from scipy.ndimage import maximum_filter
+from cecilio_dsp_engine import decode_process
+
+FINGERPRINT_RATE = 11025
+FINGERPRINT_SECONDS = 90
+WINDOW_SIZE = 1024
+HOP_SIZE = 512
+FAN_OUT = 5
+MAX_TIME_DELTA = 63
+SKETCH_SIZE = 256
+SKETCH_CACHE_SIZE = 1024
+DUPLICATE_THRESHOLD = 0.25
+# Не больше параметров в одном запросе, чем разрешает SQLite по умолчанию (999)
+QUERY_CHUNK = 500
+DEFAULT_INDEX_PATH = os.path.join(os.path.expanduser("~"), ".cecilio", "fingerprints.db")
+
+
+def load_samples(source, seconds=FINGERPRINT_SECONDS):
+    process = decode_process(source, FINGERPRINT_RATE, 1)
+    try:
+        data = process.stdout.read(seconds * FINGERPRINT_RATE * 4)
+    finally:
+        process.kill()
+        process.wait()
+    return np.frombuffer(data[:len(data) // 4 * 4], dtype=np.float32)
+
+
+def spectral_peaks(samples):
+    if len(samples) < WINDOW_SIZE:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    frames = np.lib.stride_tricks.sliding_window_view(samples, WINDOW_SIZE)[::HOP_SIZE]
+    spectrum = np.log1p(np.abs(np.fft.rfft(frames * np.hanning(WINDOW_SIZE), axis=1)))
+    # Пики: локальные максимумы в окне время×частота, заметно выше среднего уровня
+    local_max = maximum_filter(spectrum, size=(15, 15), mode="constant") == spectrum
+    times, bins = np.nonzero(local_max & (spectrum > spectrum.mean() + spectrum.std()))
+    return times, bins
+
+
+def landmark_hashes(times, bins):
+    # Пары пиков (якорь, цель) в пределах FAN_OUT соседей: hash = f1 | f2 | dt
+    hashes = []
+    for k in range(1, FAN_OUT + 1):
+        dt = times[k:] - times[:-k]
+        mask = (dt > 0) & (dt <= MAX_TIME_DELTA)
+        hashes.append((bins[:-k][mask] << 16) | (bins[k:][mask] << 6) | dt[mask])
+    if not hashes:
+        return np.empty(0, dtype=np.uint32)
+    return np.unique(np.concatenate(hashes).astype(np.uint32))
+
+
+def sketch(hashes, size=SKETCH_SIZE):
+    # Bottom-k скетч перемешанных хешей: доля общих элементов оценивает сходство треков,
+    # а размер записи в индексе не зависит от длины трека
+    mixed = np.unique((hashes.astype(np.uint64) * 2654435761) & 0xFFFFFFFF)
+    return mixed[:size].astype(np.int64)
+
+
+def fingerprint_track(source):
+    try:
+        return source, sketch(landmark_hashes(*spectral_peaks(load_samples(source))))
+    except Exception as e:
+        print(f"Error fingerprinting {source}: {e}")
+        return source, None
+
+
+def track_mtime(source):
+    if "://" in source:
+        return 0.0
+    try:
+        return os.path.getmtime(source)
+    except OSError:
+        return -1.0
+
+
+class FingerprintIndex:
+    def __init__(self, path=DEFAULT_INDEX_PATH, cache_size=SKETCH_CACHE_SIZE):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # GUI работает с индексом из одного фонового потока, а создаёт его в своём
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript("""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS tracks (
+                id INTEGER PRIMARY KEY,
+                path TEXT UNIQUE NOT NULL,
+                mtime REAL NOT NULL,
+                size INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS hashes (
+                hash INTEGER NOT NULL,
+                track_id INTEGER NOT NULL,
+                PRIMARY KEY (hash, track_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS hashes_by_track ON hashes (track_id);
+            -- Подписанные ссылки стримов живут недолго и больше не сохраняются; старые строки удаляются
+            DELETE FROM hashes WHERE track_id IN (SELECT id FROM tracks WHERE path LIKE '%://%');
+            DELETE FROM tracks WHERE path LIKE '%://%';
+        """)
+        self.cache_size = cache_size
+        self.sketch_cache = OrderedDict()
+
+    def close(self):
+        self.db.close()
+
+    def missing(self, sources):
+        # Читаются только запрошенные пути через UNIQUE-индекс, порциями, без копии всего списка
+        sources = iter(sources)
+        pending = []
+        while True:
+            chunk = list(dict.fromkeys(itertools.islice(sources, QUERY_CHUNK)))
+            if not chunk:
+                return pending
+            placeholders = ",".join("?" * len(chunk))
+            known = dict(self.db.execute(f"SELECT path, mtime FROM tracks WHERE path IN ({placeholders})", chunk))
+            pending.extend(source for source in chunk if known.get(source) != track_mtime(source))
+
+    def add(self, sources, workers=None):
+        # Снимаются отпечатки только новых или изменившихся файлов; стримы в индекс не попадают
+        pending = [source for source in self.missing(sources) if "://" not in source]
+        if not pending:
+            return 0
+        if len(pending) == 1:
+            # Один файл дешевле снять в текущем потоке, чем поднимать пул процессов
+            added = self.store_results(map(fingerprint_track, pending))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                added = self.store_results(pool.map(fingerprint_track, pending, chunksize=8))
+        self.db.commit()
+        return added
+
+    def store_results(self, results):
+        added = 0
+        for source, hashes in results:
+            if hashes is not None:
+                self.store(source, hashes)
+                added += 1
+        return added
+
+    def store(self, source, hashes):
+        self.db.execute("DELETE FROM hashes WHERE track_id IN (SELECT id FROM tracks WHERE path = ?)", (source,))
+        cursor = self.db.execute(
+            "INSERT INTO tracks (path, mtime, size) VALUES (?, ?, ?) "
+            "ON CONFLICT(path) DO UPDATE SET mtime = excluded.mtime, size = excluded.size RETURNING id",
+            (source, track_mtime(source), len(hashes)),
+        )
+        track_id = cursor.fetchone()[0]
+        self.db.executemany("INSERT OR IGNORE INTO hashes (hash, track_id) VALUES (?, ?)", ((int(h), track_id) for h in hashes))
+        self.sketch_cache.pop(source, None)
+
+    def track_sketch(self, source):
+        # LRU последних скетчей: повторные проверки одних и тех же треков не ходят в базу
+        if source in self.sketch_cache:
+            self.sketch_cache.move_to_end(source)
+            return self.sketch_cache[source]
+        rows = self.db.execute(
+            "SELECT hash FROM hashes JOIN tracks ON tracks.id = hashes.track_id WHERE tracks.path = ?", (source,)
+        ).fetchall()
+        hashes = self.sketch_cache[source] = frozenset(row[0] for row in rows)
+        while len(self.sketch_cache) > self.cache_size:
+            self.sketch_cache.popitem(last=False)
+        return hashes
+
+    def find_duplicates(self, source, threshold=DUPLICATE_THRESHOLD):
+        return self.match_sketch(self.track_sketch(source), source, threshold)
+
+    def match_sketch(self, hashes, source, threshold=DUPLICATE_THRESHOLD):
+        if not hashes:
+            return []
+        placeholders = ",".join("?" * len(hashes))
+        rows = self.db.execute(
+            f"SELECT tracks.path, COUNT(*) FROM hashes JOIN tracks ON tracks.id = hashes.track_id "
+            f"WHERE hashes.hash IN ({placeholders}) AND tracks.path != ? GROUP BY hashes.track_id HAVING COUNT(*) >= ?",
+            (*hashes, source, max(1, int(threshold * len(hashes)))),
+        ).fetchall()
+        return sorted(((path, count / len(hashes)) for path, count in rows), key=lambda row: -row[1])
+
+    def duplicate_groups(self, threshold=DUPLICATE_THRESHOLD):
+        rows = self.db.execute(
+            "SELECT a.track_id, b.track_id, COUNT(*) FROM hashes a JOIN hashes b "
+            "ON a.hash = b.hash AND a.track_id < b.track_id GROUP BY a.track_id, b.track_id HAVING COUNT(*) >= ?",
+            (max(1, int(threshold * SKETCH_SIZE)),),
+        ).fetchall()
+        parent = {}
+
+        def root(track_id):
+            while parent.get(track_id, track_id) != track_id:
+                track_id = parent[track_id]
+            return track_id
+
+        for a, b, _ in rows:
+            parent[root(b)] = root(a)
+        groups = {}
+        for track_id in parent.keys() | {a for a, _, _ in rows}:
+            groups.setdefault(root(track_id), []).append(track_id)
+        paths = dict(self.db.execute("SELECT id, path FROM tracks"))
+        return [sorted(paths[track_id] for track_id in group) for group in groups.values()]
+
+    def filter_new(self, sources, queued=(), threshold=DUPLICATE_THRESHOLD):
+        # Оставляет только треки, которых ещё нет ни в очереди, ни раньше в этом же списке
+        self.add(list(queued) + list(sources))
+        taken = set(queued)
+        accepted = []
+        for source in sources:
+            if self.is_duplicate_of(source, taken, threshold):
+                continue
+            taken.add(source)
+            accepted.append(source)
+        return accepted
+
+    def is_queued(self, source, queued, threshold=DUPLICATE_THRESHOLD):
+        # queued — TrackStore очереди: принадлежность проверяется в нём без сборки путей,
+        # треки, добавленные при выключенной проверке, индексируются здесь (повторно — только запрос к базе)
+        if source in queued:
+            return True
+        self.add(queued)
+        if "://" in source:
+            # Стрим сравнивается с индексом по скетчу в памяти, его ссылка не сохраняется
+            _, hashes = fingerprint_track(source)
+            hashes = frozenset(hashes.tolist()) if hashes is not None else frozenset()
+        else:
+            self.add([source])
+            hashes = self.track_sketch(source)
+        return any(path in queued for path, _ in self.match_sketch(hashes, source, threshold))
+
+    def is_duplicate_of(self, source, taken, threshold):
+        if source in taken:
+            return True
+        return any(path in taken for path, _ in self.find_duplicates(source, threshold))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cecilio acoustic fingerprint index")
+    parser.add_argument("--index", default=DEFAULT_INDEX_PATH, help="SQLite index path")
+    commands = parser.add_subparsers(dest="command", required=True)
+    add_parser = commands.add_parser("add", help="fingerprint files (stream URLs are not stored)")
+    add_parser.add_argument("sources", nargs="+")
+    add_parser.add_argument("--workers", type=int, default=None)
+    commands.add_parser("duplicates", help="list groups of duplicate tracks")
+    args = parser.parse_args()
+
+    index = FingerprintIndex(args.index)
+    if args.command == "add":
+        sources = []
+        for source in args.sources:
+            if os.path.isdir(source):
+                for root, _, files in os.walk(source):
+                    sources.extend(os.path.join(root, f) for f in files if f.lower().endswith((".mp3", ".wav", ".flac")))
+            else:
+                sources.append(source)
+        print(f"{index.add(sources, workers=args.workers)} tracks fingerprinted.")
+    else:
+        for group in index.duplicate_groups():
+            print("\n".join(group) + "\n")
+    index.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,37 +1,90 @@
 import os
 import sys
-import random
 from PyQt5 import QtWidgets, QtCore, QtGui
-from PyQt5.QtMultimedia import QMediaPlayer, QMediaContent
-from PyQt5.QtWidgets import QFileDialog, QMessageBox, QTableWidget, QTableWidgetItem, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QSlider
+from PyQt5.QtMultimedia import QMediaPlayer
+from PyQt5.QtWidgets import QFileDialog, QMessageBox, QTableView, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QSlider
 from cecilio_audio_visualiser import AdvancedMusicVisualiser
-
-# Импорт библиотек для стриминга
-try:
-    import soundcloud
-    from pytube import YouTube
-    from spotipy import Spotify
-    from spotipy.oauth2 import SpotifyClientCredentials
-except ImportError:
-    print("Missing required libraries. Please install soundcloud, pytube, and spotipy.")
+from cecilio_streaming import resolve_stream
+from cecilio_daemon import (
+    BackgroundTasks, CecilioPlayerEngine, CecilioControlClient, RemotePlayerState, DEFAULT_SOCKET_NAME, dsp_options,
+)
+from cecilio_metrics import configure_metrics
+from cecilio_artwork import ArtworkService
+from cecilio_track_store import TrackStore, FLAG_PLAYED
 
 os.environ["QT_OPENGL"] = "angle"
 os.environ["QT_PLUGIN_PATH"] = os.path.join(
     os.path.dirname(sys.executable), "Lib", "site-packages", "PyQt5", "Qt5", "plugins"
 )
 
+class PlaylistModel(QtCore.QAbstractTableModel):
+    # Строки не хранятся в виде QTableWidgetItem: имя и путь берутся из TrackStore только при отрисовке
+    def __init__(self, player):
+        super().__init__(player)
+        self.player = player
+        self.title = ""
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.player.playlist)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else 1
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        playlist, row = self.player.playlist, index.row()
+        if role == QtCore.Qt.DisplayRole:
+            return playlist.basename(row)
+        if role == QtCore.Qt.ToolTipRole:
+            duration = playlist.duration(row)
+            if duration < 0:
+                return playlist[row]
+            return f"{playlist[row]} ({duration // 60000}:{duration // 1000 % 60:02d})"
+        if role == QtCore.Qt.ForegroundRole and playlist.has_flag(row, FLAG_PLAYED):
+            return QtGui.QBrush(QtCore.Qt.gray)
+        if role == QtCore.Qt.DecorationRole:
+            pixmap = self.player.artwork.cached(playlist[row])
+            if pixmap is not None and not pixmap.isNull():
+                return QtGui.QIcon(pixmap)
+            if playlist.is_stream(row):
+                return self.player.style().standardIcon(QtWidgets.QStyle.SP_DriveNetIcon)
+        return None
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role == QtCore.Qt.DisplayRole and orientation == QtCore.Qt.Horizontal:
+            return self.title
+        return None
+
+    def set_title(self, title):
+        self.title = title
+        self.headerDataChanged.emit(QtCore.Qt.Horizontal, 0, 0)
+
+    def reset(self):
+        self.beginResetModel()
+        self.endResetModel()
+
+    def row_changed(self, row):
+        index = self.index(row, 0)
+        self.dataChanged.emit(index, index, [QtCore.Qt.DecorationRole])
+
+
 class CecilioMusicPlayer(QtWidgets.QMainWindow):
-    def __init__(self):
+    def __init__(self, dsp_engine=False, dsp_options=None):
         super().__init__()
-        self.media_player = QMediaPlayer(None, QMediaPlayer.StreamPlayback)
+        # Очередь и воспроизведение живут в движке, окно только отображает его состояние
+        self.engine = CecilioPlayerEngine(self, dsp_engine=dsp_engine, dsp_options=dsp_options)
+        self.media_player = self.engine.media_player
         self.visualiser = AdvancedMusicVisualiser()
-        self.playlist = []
-        self.previous_tracks = []
-        self.shuffle_playlist = []
-        self.current_index = -1
-        self.repeat = False
-        self.shuffle = False
+        self.artwork = ArtworkService(parent=self)
+        self.artwork.artworkReady.connect(self.show_artwork)
         self.language = "en"
+        self.control_client = None
+        self.remote_player = None
+        self.status_pending = False
+        self.playlist_pending = False
+        self.fingerprints = None
+        self.fingerprint_tasks = None
         self.translations = {
             "en": {
                 "window_title": "Cecilio Music Player",
@@ -54,6 +107,9 @@ class CecilioMusicPlayer(QtWidgets.QMainWindow):
                 "spotify_prompt": "Enter Spotify URL:",
                 "youtube_prompt": "Enter YouTube URL:",
                 "streaming_error": "Failed to load stream. Please check the URL.",
+                "daemon_error": "Lost connection to the Cecilio daemon.",
+                "duplicates_skipped": "{count} duplicate tracks skipped.",
+                "already_queued": "This track is already in the playlist.",
             },
             "ru": {
                 "window_title": "Плеер Cecilio",
@@ -76,6 +132,9 @@ class CecilioMusicPlayer(QtWidgets.QMainWindow):
                 "spotify_prompt": "Введите URL Spotify:",
                 "youtube_prompt": "Введите URL YouTube:",
                 "streaming_error": "Не удалось загрузить стрим. Проверьте URL.",
+                "daemon_error": "Потеряно соединение с демоном Cecilio.",
+                "duplicates_skipped": "Пропущено дубликатов: {count}.",
+                "already_queued": "Этот трек уже есть в плейлисте.",
             },
         }
         self.init_ui()
@@ -96,6 +155,16 @@ class CecilioMusicPlayer(QtWidgets.QMainWindow):
         visualisation_menu.addAction("Waves", lambda: self.visualiser.set_visualisation_mode("waves"))
         visualisation_menu.addAction("Stars", lambda: self.visualiser.set_visualisation_mode("stars"))
         visualisation_menu.addAction("Lines", lambda: self.visualiser.set_visualisation_mode("lines"))
+        visualisation_menu.addAction("Spectrogram", lambda: self.visualiser.set_visualisation_mode("spectrogram"))
+        if hasattr(self.media_player, "set_equaliser_preset"):
+            equaliser_menu = options_menu.addMenu("Equaliser")
+            equaliser_menu.addAction("Flat", lambda: self.media_player.set_equaliser_preset("flat"))
+            equaliser_menu.addAction("Bass", lambda: self.media_player.set_equaliser_preset("bass"))
+            equaliser_menu.addAction("Treble", lambda: self.media_player.set_equaliser_preset("treble"))
+            equaliser_menu.addAction("Vocal", lambda: self.media_player.set_equaliser_preset("vocal"))
+        self.skip_duplicates_action = options_menu.addAction("Skip Duplicates")
+        self.skip_duplicates_action.setCheckable(True)
+        self.skip_duplicates_action.toggled.connect(self.toggle_skip_duplicates)
         streaming_menu = menu_bar.addMenu("Streaming")
         streaming_menu.addAction("Soundcloud", self.stream_from_soundcloud)
         streaming_menu.addAction("Spotify", self.stream_from_spotify)
@@ -121,12 +190,20 @@ class CecilioMusicPlayer(QtWidgets.QMainWindow):
         self.main_layout.addWidget(self.progress_bar, alignment=QtCore.Qt.AlignCenter)
 
         # Плейлист
-        self.playlist_widget = QTableWidget(0, 1)
-        self.playlist_widget.setHorizontalHeaderLabels([self.translate("playlist_title")])
+        self.playlist_model = PlaylistModel(self)
+        self.playlist_model.set_title(self.translate("playlist_title"))
+        self.playlist_widget = QTableView()
+        self.playlist_widget.setModel(self.playlist_model)
         self.playlist_widget.horizontalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Stretch)
         self.playlist_widget.verticalHeader().setVisible(False)
         self.playlist_widget.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
         self.playlist_widget.setFixedHeight(180)
+        self.playlist_widget.setIconSize(QtCore.QSize(24, 24))
+        # Обложки грузятся только для видимых строк и после паузы в прокрутке
+        self.artwork_timer = QtCore.QTimer(self)
+        self.artwork_timer.setSingleShot(True)
+        self.artwork_timer.timeout.connect(self.request_visible_artwork)
+        self.playlist_widget.verticalScrollBar().valueChanged.connect(lambda: self.artwork_timer.start(50))
         self.main_layout.addWidget(self.playlist_widget)
 
         # Панель управления
@@ -172,11 +249,29 @@ class CecilioMusicPlayer(QtWidgets.QMainWindow):
         self.volume_slider.valueChanged.connect(self.change_volume)
         self.media_player.positionChanged.connect(self.update_progress)
         self.media_player.durationChanged.connect(self.set_progress_max)
-        self.media_player.mediaStatusChanged.connect(self.handle_media_end)
+        self.media_player.stateChanged.connect(self.update_play_state)
+        self.engine.trackChanged.connect(self.show_current_track)
+        self.engine.playlistChanged.connect(self.update_playlist)
 
         # Горячие клавиши
         QtWidgets.QShortcut(QtGui.QKeySequence(QtCore.Qt.Key_Space), self).activated.connect(self.play_pause_music)
 
+    @property
+    def playlist(self):
+        return self.engine.playlist
+
+    @playlist.setter
+    def playlist(self, playlist):
+        self.engine.playlist = playlist
+
+    @property
+    def current_index(self):
+        return self.engine.current_index
+
+    @current_index.setter
+    def current_index(self, index):
+        self.engine.current_index = index
+
     def translate(self, key):
         return self.translations[self.language].get(key, key)
 
@@ -186,108 +281,197 @@ class CecilioMusicPlayer(QtWidgets.QMainWindow):
         self.update_ui_texts()
 
     def update_ui_texts(self):
-        self.play_pause_button.setText(self.translate("play" if self.media_player.state() != QMediaPlayer.PlayingState else "pause"))
+        self.play_pause_button.setText(self.translate("play" if self.player_state() != QMediaPlayer.PlayingState else "pause"))
         self.next_button.setText(self.translate("next"))
         self.prev_button.setText(self.translate("previous"))
         self.open_button.setText(self.translate("open_files"))
         self.shuffle_button.setText(self.translate("shuffle"))
         self.shuffle_playlist_button.setText(self.translate("shuffle_playlist"))
         self.repeat_button.setText(self.translate("repeat"))
-        self.playlist_widget.setHorizontalHeaderLabels([self.translate("playlist_title")])
+        self.playlist_model.set_title(self.translate("playlist_title"))
         self.volume_text.setText(self.translate("volume"))
 
 
+    def attach_to_daemon(self, socket_name=DEFAULT_SOCKET_NAME):
+        # GUI как клиент демона: команды уходят в сокет, состояние опрашивается по таймеру, ответы приходят асинхронно
+        self.control_client = CecilioControlClient(socket_name, self)
+        self.control_client.connect_to_daemon()
+        self.media_player.stop()
+        self.remote_player = RemotePlayerState()
+        self.daemon_timer = QtCore.QTimer(self)
+        self.daemon_timer.timeout.connect(self.sync_with_daemon)
+        self.daemon_timer.start(250)
+        self.sync_with_daemon()
+
+    def daemon_request(self, cmd, callback=None, timeout=5000, **args):
+        self.control_client.send(cmd, lambda result, error: self.daemon_reply(callback, result, error), timeout, **args)
+
+    def daemon_command(self, cmd, timeout=5000, **args):
+        # Команда, меняющая очередь или воспроизведение: после ответа окно сразу синхронизируется
+        self.daemon_request(cmd, lambda result: self.sync_with_daemon(), timeout, **args)
+
+    def daemon_reply(self, callback, result, error):
+        if isinstance(error, (ConnectionError, TimeoutError)):
+            self.status_pending = self.playlist_pending = False
+            # Ошибку показываем один раз, остальные ожидавшие ответы после остановки опроса игнорируются
+            if self.daemon_timer.isActive():
+                self.daemon_timer.stop()
+                QMessageBox.critical(self, "Error", self.translate("daemon_error"))
+        elif error is not None:
+            self.status_pending = self.playlist_pending = False
+            QMessageBox.critical(self, "Error", str(error))
+        elif callback is not None:
+            callback(result)
+
+    def player_state(self):
+        # В режиме клиента состояние берётся из последнего status демона
+        return (self.remote_player or self.media_player).state()
+
+    def sync_with_daemon(self):
+        if not self.status_pending:
+            self.status_pending = True
+            self.daemon_request("status", self.apply_daemon_status)
+
+    def apply_daemon_status(self, status):
+        self.status_pending = False
+        previous, self.remote_player.status = self.remote_player.status, status
+        index = status["index"]
+        track_differs = status["track"] is not None and (not 0 <= index < len(self.playlist) or self.playlist[index] != status["track"])
+        if status["length"] != len(self.playlist) or track_differs:
+            # Текущий трек обновится, когда придёт новый плейлист
+            if not self.playlist_pending:
+                self.playlist_pending = True
+                self.daemon_request("playlist", self.apply_daemon_playlist)
+        elif index != self.current_index or status["track"] != previous.get("track"):
+            self.show_daemon_track(index)
+        self.progress_bar.setMaximum(status["duration"])
+        if not self.progress_bar.isSliderDown():
+            self.progress_bar.setValue(status["position"])
+        if status["state"] != previous.get("state"):
+            self.update_play_state(self.remote_player.state())
+
+    def apply_daemon_playlist(self, tracks):
+        self.playlist_pending = False
+        self.playlist = TrackStore(tracks or [])
+        self.update_playlist()
+        self.show_daemon_track(self.remote_player.status.get("index", -1))
+
+    def show_daemon_track(self, index):
+        self.current_index = index
+        if 0 <= index < len(self.playlist):
+            self.show_current_track(index)
+        else:
+            self.highlight_current_track()
+
     def shuffle_playlist_action(self):
+        if self.control_client:
+            return self.daemon_command("shuffle_playlist")
         if not self.playlist:
             QMessageBox.warning(self, self.translate("playlist_title"), self.translate("error_no_files"))
             return
-        random.shuffle(self.playlist)  # Перемешивание списка треков
-        self.current_index = 0  # Установка текущего индекса на первый трек после перемешивания
-        self.update_playlist()  # Обновление отображения плейлиста
-        self.play_music()  # Автоматическое воспроизведение первого трека
+        self.engine.shuffle_playlist_action()  # Перемешивание и воспроизведение первого трека
         QMessageBox.information(self, self.translate("playlist_title"), self.translate("playlist_shuffled"))
 
-# DOESN'T WORK?
-    def update_playlist(self):
-        self.playlist_widget.setRowCount(len(self.playlist))
-        for i, track in enumerate(self.playlist):
-            item = QTableWidgetItem(os.path.basename(track))
-            item.setToolTip(track)
-            self.playlist_widget.setItem(i, 0, item)
-        self.highlight_current_track()
-
-
-    def generate_shuffle_playlist(self):
-        self.shuffle_playlist = random.sample(range(len(self.playlist)), len(self.playlist))
-
-
     def play_pause_music(self):
+        if self.control_client:
+            return self.daemon_command("toggle")
         if self.media_player.state() == QMediaPlayer.PlayingState:
             self.pause_music()
         else:
             self.play_music()
 
     def play_music(self):
-        if self.current_index == -1 and self.playlist:
-            self.current_index = 0
-        if not self.playlist or self.current_index == -1:
+        if not self.engine.play():
             QMessageBox.warning(self, self.translate("playlist_title"), self.translate("error_no_files"))
-            return
-        file_path = self.playlist[self.current_index]
-        if self.media_player.media().canonicalUrl().toString() != QtCore.QUrl.fromLocalFile(file_path).toString():
-            self.media_player.setMedia(QMediaContent(QtCore.QUrl.fromLocalFile(file_path)))
-        self.media_player.play()
-        self.play_pause_button.setText(self.translate("pause"))
-        self.visualiser.start_visualisation(self.media_player)
-        self.highlight_current_track()
 
     def pause_music(self):
-        self.media_player.pause()
-        self.play_pause_button.setText(self.translate("play"))
-        self.visualiser.stop_visualisation()
+        self.engine.pause()
 
-    def prev_track(self):
-        if not self.playlist:
-            return
-        if self.previous_tracks:
-            self.current_index = self.previous_tracks.pop()
+    def update_play_state(self, state):
+        if state == QMediaPlayer.PlayingState:
+            self.play_pause_button.setText(self.translate("pause"))
+            self.visualiser.start_visualisation(self.remote_player or self.media_player)
         else:
-            if self.media_player.position() > 5000:
-                self.media_player.setPosition(0)
-                return
-            self.current_index = (self.current_index - 1) % len(self.playlist)
-        self.play_music()
+            self.play_pause_button.setText(self.translate("play"))
+            self.visualiser.stop_visualisation()
+
+    def show_current_track(self, index):
+        self.show_current_artwork()
+        self.highlight_current_track()
+
+    def prev_track(self):
+        if self.control_client:
+            return self.daemon_command("prev")
+        self.engine.prev_track()
 
     def next_track(self):
-        if not self.playlist:
-            return
-        if self.shuffle:
-            self.previous_tracks.append(self.current_index)
-            self.current_index = self.shuffle_playlist.pop(0) if self.shuffle_playlist else 0
-        else:
-            self.previous_tracks.append(self.current_index)
-            self.current_index = (self.current_index + 1) % len(self.playlist)
-        self.play_music()
+        if self.control_client:
+            return self.daemon_command("next")
+        self.engine.next_track()
 
     def open_files(self):
+        files, _ = QFileDialog.getOpenFileNames(self, self.translate("open_files"), "", "Audio Files (*.mp3 *.wav *.flac)")
+        if not files:
+            return
+        if not self.skip_duplicates_action.isChecked():
+            return self.load_files(files)
+        # Отпечатки снимаются в фоне, список загружается, когда проверка закончится
+        QtWidgets.QApplication.setOverrideCursor(QtCore.Qt.BusyCursor)
+        self.fingerprint_tasks.run(
+            lambda unique, error: self.files_checked(files, unique, error), self.fingerprints.filter_new, files
+        )
+
+    def files_checked(self, files, unique, error):
+        QtWidgets.QApplication.restoreOverrideCursor()
+        if error is not None:
+            QMessageBox.critical(self, "Error", str(error))
+            return
+        if len(unique) < len(files):
+            QMessageBox.information(self, self.translate("playlist_title"), self.translate("duplicates_skipped").format(count=len(files) - len(unique)))
+        self.load_files(unique)
+
+    def load_files(self, files):
         try:
-            files, _ = QFileDialog.getOpenFileNames(self, self.translate("open_files"), "", "Audio Files (*.mp3 *.wav *.flac)")
-            if files:
-                self.playlist = files
-                self.current_index = 0
-                self.previous_tracks = []
-                self.update_playlist()
+            if files and self.control_client:
+                self.daemon_command("batch_enqueue", tracks=files, replace=True)
+            elif files:
+                self.engine.enqueue_many(files, replace=True)
                 QMessageBox.information(self, self.translate("playlist_title"), self.translate("playlist_loaded").format(count=len(files)))
         except Exception as e:
             QMessageBox.critical(self, "Error", str(e))
 
     def update_playlist(self):
-        self.playlist_widget.setRowCount(len(self.playlist))
-        for i, track in enumerate(self.playlist):
-            item = QTableWidgetItem(os.path.basename(track))
-            item.setToolTip(track)
-            self.playlist_widget.setItem(i, 0, item)
+        if self.artwork.thumbnail_urls:
+            self.artwork.retain_thumbnail_urls(self.playlist)
+        self.playlist_model.reset()
         self.highlight_current_track()
+        self.artwork_timer.start(0)
+
+    def visible_rows(self):
+        first = self.playlist_widget.rowAt(0)
+        if first < 0:
+            return range(0)
+        last = self.playlist_widget.rowAt(self.playlist_widget.viewport().height() - 1)
+        return range(first, (last if last >= 0 else len(self.playlist) - 1) + 1)
+
+    def request_visible_artwork(self):
+        current = self.playlist[self.current_index] if 0 <= self.current_index < len(self.playlist) else None
+        self.artwork.cancel_pending(keep=current)
+        for row in self.visible_rows():
+            self.artwork.request(self.playlist[row])
+
+    def show_artwork(self, track, pixmap):
+        if pixmap.isNull():
+            return
+        for row in self.visible_rows():
+            if self.playlist[row] == track:
+                self.playlist_model.row_changed(row)
+        if 0 <= self.current_index < len(self.playlist) and self.playlist[self.current_index] == track:
+            self.visualiser.set_artwork(pixmap)
+
+    def show_current_artwork(self):
+        pixmap = self.artwork.request(self.playlist[self.current_index])
+        self.visualiser.set_artwork(pixmap if pixmap is not None and not pixmap.isNull() else None)
 
     def highlight_current_track(self):
         self.playlist_widget.clearSelection()
@@ -295,20 +479,23 @@ class CecilioMusicPlayer(QtWidgets.QMainWindow):
             self.playlist_widget.selectRow(self.current_index)
 
     def toggle_shuffle(self):
-        self.shuffle = self.shuffle_button.isChecked()
-        if self.shuffle:
-            self.generate_shuffle_playlist()
+        if self.control_client:
+            self.daemon_request("shuffle", enabled=self.shuffle_button.isChecked())
+            return
+        self.engine.set_shuffle(self.shuffle_button.isChecked())
 
-    def toggle_repeat(self):
-        self.repeat = self.repeat_button.isChecked()
+    def toggle_skip_duplicates(self, enabled):
+        if enabled and self.fingerprints is None:
+            from cecilio_fingerprint import FingerprintIndex
+            self.fingerprints = FingerprintIndex()
+            # Один поток: соединение SQLite используется только из него
+            self.fingerprint_tasks = BackgroundTasks(workers=1, parent=self)
 
-    def handle_media_end(self, status):
-        if status == QMediaPlayer.EndOfMedia:
-            if self.repeat:
-                self.media_player.setPosition(0)
-                self.media_player.play()
-            else:
-                self.next_track()
+    def toggle_repeat(self):
+        if self.control_client:
+            self.daemon_request("repeat", enabled=self.repeat_button.isChecked())
+            return
+        self.engine.set_repeat(self.repeat_button.isChecked())
 
     def set_progress_max(self, duration):
         self.progress_bar.setMaximum(duration)
@@ -317,53 +504,84 @@ class CecilioMusicPlayer(QtWidgets.QMainWindow):
         self.progress_bar.setValue(position)
 
     def set_position(self, position):
+        if self.control_client:
+            self.daemon_request("seek", position=position)
+            return
         self.media_player.setPosition(position)
 
     def change_volume(self, value):
         self.volume_label.setText(f"{value}%")
+        if self.control_client:
+            self.daemon_request("volume", volume=value)
+            return
         self.media_player.setVolume(value)
 
 
     def stream_from_soundcloud(self):
         url, ok = QtWidgets.QInputDialog.getText(self, "Soundcloud", self.translate("soundcloud_prompt"))
         if ok and url:
-            try:
-                client = soundcloud.Client(client_id="YOUR_SOUNDCLOUD_CLIENT_ID")
-                track = client.get("/resolve", url=url)
-                stream_url = client.get(track.stream_url, allow_redirects=False).location
-                self.playlist.append(stream_url)
-                self.update_playlist()
-            except Exception as e:
-                QMessageBox.critical(self, "Error", self.translate("streaming_error"))
+            self.add_stream("soundcloud", url)
 
     def stream_from_spotify(self):
         url, ok = QtWidgets.QInputDialog.getText(self, "Spotify", self.translate("spotify_prompt"))
         if ok and url:
-            try:
-                sp = Spotify(auth_manager=SpotifyClientCredentials(client_id="YOUR_SPOTIFY_CLIENT_ID", client_secret="YOUR_SPOTIFY_CLIENT_SECRET"))
-                results = sp.track(url)
-                stream_url = results["preview_url"]
-                if stream_url:
-                    self.playlist.append(stream_url)
-                    self.update_playlist()
-                else:
-                    raise Exception("No preview available.")
-            except Exception as e:
-                QMessageBox.critical(self, "Error", self.translate("streaming_error"))
+            self.add_stream("spotify", url)
 
     def stream_from_youtube(self):
         url, ok = QtWidgets.QInputDialog.getText(self, "YouTube", self.translate("youtube_prompt"))
         if ok and url:
-            try:
-                yt = YouTube(url)
-                stream_url = yt.streams.filter(only_audio=True).first().url
-                self.playlist.append(stream_url)
-                self.update_playlist()
-            except Exception as e:
-                QMessageBox.critical(self, "Error", self.translate("streaming_error"))
+            self.add_stream("youtube", url)
+
+    def add_stream(self, provider, url):
+        if self.control_client:
+            # Демон сам разрешает ссылку, чтобы адрес стрима был у того, кто играет
+            return self.daemon_command("enqueue", timeout=30000, provider=provider, url=url)
+        self.engine.tasks.run(self.stream_resolved, resolve_stream, provider, url)
+
+    def stream_resolved(self, stream, error):
+        if error is not None:
+            QMessageBox.critical(self, "Error", self.translate("streaming_error"))
+            return
+        if not self.skip_duplicates_action.isChecked():
+            return self.enqueue_stream(stream, False, None)
+        self.fingerprint_tasks.run(
+            lambda queued, error: self.enqueue_stream(stream, queued, error),
+            self.fingerprints.is_queued, stream.stream_url, self.playlist,
+        )
+
+    def enqueue_stream(self, stream, queued, error):
+        if error is not None:
+            QMessageBox.critical(self, "Error", str(error))
+            return
+        if queued:
+            QMessageBox.information(self, self.translate("playlist_title"), self.translate("already_queued"))
+            return
+        self.artwork.set_thumbnail_url(stream.stream_url, stream.thumbnail_url)
+        self.engine.enqueue(stream.stream_url)
+
+def argument_value(name, default=None):
+    if name in sys.argv:
+        position = sys.argv.index(name) + 1
+        if position < len(sys.argv) and not sys.argv[position].startswith("-"):
+            return sys.argv[position]
+    return default
 
 if __name__ == "__main__":
     app = QtWidgets.QApplication(sys.argv)
-    window = CecilioMusicPlayer()
+    configure_metrics(argument_value("--metrics-port"), argument_value("--metrics-log"))
+    window = CecilioMusicPlayer(
+        dsp_engine="--dsp" in sys.argv,
+        dsp_options=dsp_options(
+            argument_value("--dsp-block-size"), argument_value("--dsp-blocks"), argument_value("--dsp-output-blocks")
+        ),
+    )
+    if "--attach" in sys.argv:
+        # python cecilio_main.py --attach [имя сокета] — подключиться к cecilio_daemon.py
+        window.attach_to_daemon(argument_value("--attach", DEFAULT_SOCKET_NAME))
     window.show()
-    sys.exit(app.exec_())
+    exit_code = app.exec_()
+    window.artwork.shutdown()
+    window.engine.tasks.shutdown()
+    if window.fingerprint_tasks is not None:
+        window.fingerprint_tasks.shutdown()
+    sys.exit(exit_code)
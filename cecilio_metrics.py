@@ -0,0 +1,182 @@
+import bisect
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging.handlers import RotatingFileHandler
+from PyQt5 import QtCore
+from PyQt5.QtMultimedia import QMediaPlayer
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+METRIC_HELP = {
+    "cecilio_media_load_seconds": ("histogram", "Time from setMedia until the media is buffered and can play."),
+    "cecilio_media_loaded_seconds": ("histogram", "Time from setMedia until the media is loaded, before buffering."),
+    "cecilio_buffering_events_total": ("counter", "Buffering and stalled media events by kind."),
+    "cecilio_buffering_seconds": ("histogram", "Time spent in buffering or stalled state by kind."),
+    "cecilio_invalid_media_total": ("counter", "Media that failed to load."),
+    "cecilio_stream_resolve_seconds": ("histogram", "Stream URL resolution latency by provider."),
+    "cecilio_stream_resolve_errors_total": ("counter", "Failed stream resolutions by provider."),
+    "cecilio_track_switch_gap_seconds": ("histogram", "Gap between end of a track and the next one being buffered."),
+    "cecilio_visualiser_frame_seconds": ("histogram", "Visualiser frame cost by mode."),
+    "cecilio_dsp_underruns_total": ("counter", "DSP engine ring buffer underruns."),
+}
+
+
+def label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class PlayerMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.logger = None
+        self.server = None
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+        self.log(name, value, labels)
+
+    def observe(self, name, seconds, log=True, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * (len(DEFAULT_BUCKETS) + 1), 0.0]
+            histogram[0][bisect.bisect_left(DEFAULT_BUCKETS, seconds)] += 1
+            histogram[1] += seconds
+        if log:
+            self.log(name, seconds, labels)
+
+    @contextmanager
+    def timer(self, name, log=True, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, log=log, **labels)
+
+    def log(self, name, value, labels):
+        if self.logger is not None:
+            self.logger.info(json.dumps({"ts": time.time(), "metric": name, "value": value, "labels": labels}))
+
+    def render(self):
+        # Текстовый формат Prometheus
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((key, (list(buckets), total)) for key, (buckets, total) in self.histograms.items())
+        lines = []
+        described = set()
+
+        def describe(name):
+            if name not in described and name in METRIC_HELP:
+                kind, help_text = METRIC_HELP[name]
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                described.add(name)
+
+        for (name, labels), value in counters:
+            describe(name)
+            lines.append(f"{name}{label_text(labels)} {value}")
+        for (name, labels), (buckets, total) in histograms:
+            describe(name)
+            cumulative = 0
+            for bound, count in zip((*DEFAULT_BUCKETS, "+Inf"), buckets):
+                cumulative += count
+                lines.append(f"{name}_bucket{label_text(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{name}_sum{label_text(labels)} {total}")
+            lines.append(f"{name}_count{label_text(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+    def enable_log(self, path, max_bytes=5 * 1024 * 1024, backup_count=3):
+        handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        self.logger = logging.getLogger("cecilio.metrics")
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        self.logger.addHandler(handler)
+
+    def start_http_server(self, port, host="127.0.0.1"):
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        print(f"Metrics available at http://{host}:{port}/metrics")
+
+
+metrics = PlayerMetrics()
+
+
+def configure_metrics(port=None, log_path=None):
+    if log_path:
+        metrics.enable_log(log_path)
+    if port:
+        metrics.start_http_server(int(port))
+
+
+class MediaPlayerMonitor(QtCore.QObject):
+    # Следит за mediaStatusChanged и переводит переходы статусов в метрики
+    STALL_KINDS = {QMediaPlayer.BufferingMedia: "buffering", QMediaPlayer.StalledMedia: "stalled"}
+
+    def __init__(self, media_player, parent=None):
+        super().__init__(parent)
+        self.load_started = None
+        self.track_ended = None
+        self.stall_kind = None
+        self.stall_started = None
+        media_player.mediaStatusChanged.connect(self.handle_status)
+
+    def handle_status(self, status):
+        now = time.perf_counter()
+        kind = self.STALL_KINDS.get(status)
+        # Смена вида (buffering -> stalled) закрывает текущий интервал и открывает новый
+        if self.stall_kind is not None and kind != self.stall_kind:
+            metrics.observe("cecilio_buffering_seconds", now - self.stall_started, kind=self.stall_kind)
+            self.stall_kind = None
+        if status == QMediaPlayer.LoadingMedia:
+            self.load_started = now
+        elif status == QMediaPlayer.LoadedMedia:
+            # LoadedMedia приходит до буферизации, поэтому загрузка считается законченной только на BufferedMedia
+            if self.load_started is not None:
+                metrics.observe("cecilio_media_loaded_seconds", now - self.load_started)
+        elif status == QMediaPlayer.BufferedMedia:
+            if self.load_started is not None:
+                metrics.observe("cecilio_media_load_seconds", now - self.load_started)
+                self.load_started = None
+            if self.track_ended is not None:
+                metrics.observe("cecilio_track_switch_gap_seconds", now - self.track_ended)
+                self.track_ended = None
+        elif kind is not None:
+            # Буферизация во время первой загрузки входит во время загрузки, а не в провалы воспроизведения
+            if self.stall_kind is None and self.load_started is None:
+                self.stall_kind = kind
+                self.stall_started = now
+                metrics.inc("cecilio_buffering_events_total", kind=kind)
+        elif status == QMediaPlayer.EndOfMedia:
+            self.track_ended = now
+        elif status == QMediaPlayer.InvalidMedia:
+            metrics.inc("cecilio_invalid_media_total")
+            self.load_started = None
@@ -0,0 +1,69 @@
+from collections import namedtuple
+from PyQt5 import QtCore
+from cecilio_metrics import metrics
+
+# Импорт библиотек для стриминга
+try:
+    import soundcloud
+    from pytube import YouTube
+    from spotipy import Spotify
+    from spotipy.oauth2 import SpotifyClientCredentials
+except ImportError:
+    print("Missing required libraries. Please install soundcloud, pytube, and spotipy.")
+
+SOUNDCLOUD_CLIENT_ID = "YOUR_SOUNDCLOUD_CLIENT_ID"
+SPOTIFY_CLIENT_ID = "YOUR_SPOTIFY_CLIENT_ID"
+SPOTIFY_CLIENT_SECRET = "YOUR_SPOTIFY_CLIENT_SECRET"
+
+# Результат разрешения ссылки стриминга: прямой адрес аудио плюс метаданные
+ResolvedStream = namedtuple("ResolvedStream", ["provider", "stream_url", "title", "thumbnail_url"])
+
+
+def resolve_soundcloud(url):
+    client = soundcloud.Client(client_id=SOUNDCLOUD_CLIENT_ID)
+    track = client.get("/resolve", url=url)
+    stream_url = client.get(track.stream_url, allow_redirects=False).location
+    return ResolvedStream("soundcloud", stream_url, getattr(track, "title", None), getattr(track, "artwork_url", None))
+
+
+def resolve_spotify(url):
+    sp = Spotify(auth_manager=SpotifyClientCredentials(client_id=SPOTIFY_CLIENT_ID, client_secret=SPOTIFY_CLIENT_SECRET))
+    results = sp.track(url)
+    stream_url = results["preview_url"]
+    if not stream_url:
+        raise Exception("No preview available.")
+    images = results.get("album", {}).get("images") or []
+    thumbnail_url = images[-1]["url"] if images else None
+    return ResolvedStream("spotify", stream_url, results.get("name"), thumbnail_url)
+
+
+def resolve_youtube(url):
+    yt = YouTube(url)
+    stream_url = yt.streams.filter(only_audio=True).first().url
+    return ResolvedStream("youtube", stream_url, yt.title, yt.thumbnail_url)
+
+
+RESOLVERS = {
+    "soundcloud": resolve_soundcloud,
+    "spotify": resolve_spotify,
+    "youtube": resolve_youtube,
+}
+
+
+def media_url(track):
+    # Локальные файлы и прямые ссылки стриминга лежат в одном плейлисте
+    if "://" in track:
+        return QtCore.QUrl(track)
+    return QtCore.QUrl.fromLocalFile(track)
+
+
+def resolve_stream(provider, url):
+    resolver = RESOLVERS.get(provider)
+    if resolver is None:
+        raise ValueError(f"Unknown streaming provider: {provider}")
+    try:
+        with metrics.timer("cecilio_stream_resolve_seconds", provider=provider):
+            return resolver(url)
+    except Exception:
+        metrics.inc("cecilio_stream_resolve_errors_total", provider=provider)
+        raise
@@ -0,0 +1,129 @@
+import bisect
+import random
+from array import array
+
+SOURCE_LOCAL = 0
+SOURCE_STREAM = 1
+
+FLAG_PLAYED = 1
+
+
+class TrackStore:
+    # Компактный плейлист: треки — целые id, поля лежат в колонках array,
+    # а папки и URL-префиксы хранятся один раз в общей таблице
+    def __init__(self, tracks=()):
+        self.prefixes = []
+        self.prefix_ids = {}
+        self.names = bytearray()
+        self.prefix_column = array("I")
+        self.name_offsets = array("Q")
+        self.name_lengths = array("I")
+        self.source_types = array("B")
+        self.durations = array("i")
+        self.flags = array("B")
+        # Порядок воспроизведения: позиция в плейлисте -> id трека
+        self.order = array("I")
+        self.extend(tracks)
+
+    def intern_prefix(self, prefix):
+        prefix_id = self.prefix_ids.get(prefix)
+        if prefix_id is None:
+            prefix_id = self.prefix_ids[prefix] = len(self.prefixes)
+            self.prefixes.append(prefix)
+        return prefix_id
+
+    @staticmethod
+    def split(track):
+        split = max(track.rfind("/"), track.rfind("\\")) + 1
+        return track[:split], track[split:].encode("utf-8")
+
+    def add_track(self, track):
+        prefix, name = self.split(track)
+        track_id = len(self.prefix_column)
+        self.prefix_column.append(self.intern_prefix(prefix))
+        self.name_offsets.append(len(self.names))
+        self.name_lengths.append(len(name))
+        self.names += name
+        self.source_types.append(SOURCE_STREAM if "://" in track else SOURCE_LOCAL)
+        self.durations.append(-1)
+        self.flags.append(0)
+        return track_id
+
+    def append(self, track):
+        self.order.append(self.add_track(track))
+
+    def extend(self, tracks):
+        for track in tracks:
+            self.order.append(self.add_track(track))
+
+    def clear(self):
+        self.__init__()
+
+    def shuffle(self):
+        order = self.order.tolist()
+        random.shuffle(order)
+        self.order = array("I", order)
+
+    def name(self, track_id):
+        offset = self.name_offsets[track_id]
+        return self.names[offset:offset + self.name_lengths[track_id]].decode("utf-8")
+
+    def path(self, track_id):
+        return self.prefixes[self.prefix_column[track_id]] + self.name(track_id)
+
+    def track_id(self, index):
+        return self.order[index]
+
+    def basename(self, index):
+        return self.name(self.order[index])
+
+    def is_stream(self, index):
+        return self.source_types[self.order[index]] == SOURCE_STREAM
+
+    def duration(self, index):
+        return self.durations[self.order[index]]
+
+    def set_duration(self, index, duration):
+        self.durations[self.order[index]] = duration
+
+    def set_flag(self, index, flag):
+        self.flags[self.order[index]] |= flag
+
+    def has_flag(self, index, flag):
+        return bool(self.flags[self.order[index]] & flag)
+
+    def __len__(self):
+        return len(self.order)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.path(track_id) for track_id in self.order[index]]
+        return self.path(self.order[index])
+
+    def __iter__(self):
+        for track_id in self.order:
+            yield self.path(track_id)
+
+    def __contains__(self, track):
+        # Поиск по id префикса и имени прямо в байтах имён, без сборки строк путей
+        prefix, name = self.split(track)
+        prefix_id = self.prefix_ids.get(prefix)
+        if prefix_id is None:
+            return False
+        if not name:
+            return any(
+                self.prefix_column[track_id] == prefix_id and not self.name_lengths[track_id]
+                for track_id in range(len(self.prefix_column))
+            )
+        position = self.names.find(name)
+        while position != -1:
+            # name_offsets растут по порядку добавления, id трека по смещению находится бинарным поиском
+            track_id = bisect.bisect_right(self.name_offsets, position) - 1
+            if (
+                self.name_offsets[track_id] == position
+                and self.name_lengths[track_id] == len(name)
+                and self.prefix_column[track_id] == prefix_id
+            ):
+                return True
+            position = self.names.find(name, position + 1)
+        return False